@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -33,6 +35,37 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
     'Пожалуйста зарегистрируйте приложение в `settings.INSTALLED_APPS`'
 )
 
+@pytest.fixture(autouse=True, scope='session')
+def isolated_shared_cache():
+    """Свой каталог общего кеша на прогон, как у manage.py test."""
+    from core.testing import isolated_shared_cache
+
+    override = isolated_shared_cache()
+    override.enable()
+    yield
+    override.disable()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    База после теста откатывается, а кеш — нет; сброс по фиксации
+    в откатываемой транзакции не срабатывает.
+    """
+    from django.core.cache import cache
+
+    cache.clear()
+
+
+@pytest.fixture(autouse=True, scope='session')
+def drop_pending_views():
+    """Просмотры из тестов не должны дописаться в настоящую базу."""
+    yield
+    from posts import view_counts
+
+    view_counts._take()
+
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'name', 'status', 'priority', 'attempts', 'run_at', 'locked_by'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'last_error')
+
+
+admin.site.register(Task, TaskAdmin)
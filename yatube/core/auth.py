@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+USER_KEY_PREFIX = 'auth_user:'
+
+
+def _user_key(user_id):
+    return f'{USER_KEY_PREFIX}{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend, который берёт пользователя сессии из кеша: запрос
+    авторизованного пользователя не ходит в auth_user. Копию сбрасывает
+    forget_user при сохранении и удалении пользователя — в том числе
+    после смены пароля, так что проверка хеша сессии видит новый пароль.
+    Запись мимо сигналов (update()) видна через AUTH_USER_CACHE_TIMEOUT.
+    Без копии в кеше пользователь читается из базы, так что второй
+    бэкенд не нужен: с ним неудачный вход проверял бы пароль дважды.
+    """
+
+    def get_user(self, user_id):
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+
+def forget_user(sender, instance, **kwargs):
+    cache.delete(_user_key(instance.pk))
@@ -0,0 +1,225 @@
+import fcntl
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.exceptions import ImproperlyConfigured
+
+_MISSING = object()
+
+# Как в LocMemCache: Django создаёт свой экземпляр бэкенда в каждом
+# потоке, а локальный уровень и блокировки должны быть общими
+# для процесса. Состояние делят экземпляры с одним LOCATION.
+_states = {}
+_states_lock = threading.Lock()
+
+
+def _state(location):
+    with _states_lock:
+        if location not in _states:
+            _states[location] = {
+                'local': OrderedDict(),
+                'lock': threading.Lock(),
+                'stats': dict.fromkeys((
+                    'local_hits', 'local_misses', 'shared_hits',
+                    'shared_misses', 'revalidations', 'stale', 'evictions',
+                ), 0),
+            }
+        return _states[location]
+
+
+class AtomicFileBasedCache(FileBasedCache):
+    """
+    FileBasedCache, у которого add атомарен и между процессами: проверка
+    и запись идут под flock на файле в каталоге кеша. На add держатся
+    все блокировки single-flight, а родной add — has_key, затем set.
+    """
+    atomic_add = True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        lock_path = os.path.join(self._dir, '.add.lock')
+        with open(lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return super().add(key, value, timeout, version)
+
+
+# Бэкенды, чей add атомарен между воркерами (LocMemCache — один процесс).
+ATOMIC_ADD_BACKENDS = (BaseMemcachedCache, DatabaseCache, LocMemCache)
+
+
+def _check_atomic_add(backend):
+    if not (
+        isinstance(backend, ATOMIC_ADD_BACKENDS)
+        or getattr(backend, 'atomic_add', False)
+    ):
+        raise ImproperlyConfigured(
+            f'{type(backend).__name__}.add не атомарен между процессами: '
+            'общим уровнем TwoTierCache может быть memcached, '
+            'DatabaseCache или core.cache.AtomicFileBasedCache.'
+        )
+
+
+class TwoTierCache(BaseCache):
+    """
+    Ограниченный LRU-кеш процесса перед общим кешем (OPTIONS['SHARED']).
+    Локально значения хранятся сериализованными, как в LocMemCache,
+    чтобы запросы не делили между собой один изменяемый объект.
+
+    Рядом со значением в общем кеше лежит ключ версии. Локальная копия
+    считается верной CHECK_INTERVAL секунд, затем сверяется с версией
+    одним коротким запросом; set/delete в любом процессе меняют версию,
+    так что чужие локальные копии устаревают не дольше этого интервала.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options['SHARED']
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 60)
+        self.check_interval = options.get('CHECK_INTERVAL', 1)
+        state = _state(location)
+        self._local = state['local']
+        self._lock = state['lock']
+        self._stats = state['stats']
+        self._checked = False
+
+    @property
+    def shared(self):
+        backend = caches[self.shared_alias]
+        if not self._checked:
+            _check_atomic_add(backend)
+            self._checked = True
+        return backend
+
+    @staticmethod
+    def version_key(key):
+        return f'{key}:version'
+
+    def _count(self, name):
+        self._stats[name] += 1
+
+    def stats(self):
+        """Статистика по уровням для текущего процесса."""
+        with self._lock:
+            return {**self._stats, 'local_entries': len(self._local)}
+
+    def _remember(self, local_key, value, stamp, timeout=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        local_timeout = self.local_timeout
+        if timeout is not None:
+            local_timeout = min(local_timeout, timeout)
+        if local_timeout <= 0:
+            self._forget(local_key)
+            return
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.monotonic()
+        with self._lock:
+            self._local[local_key] = (value, stamp, now + local_timeout, now)
+            self._local.move_to_end(local_key)
+            while len(self._local) > self._max_entries:
+                self._local.popitem(last=False)
+                self._count('evictions')
+
+    def _forget(self, local_key):
+        with self._lock:
+            self._local.pop(local_key, None)
+
+    def _local_get(self, key, local_key, version):
+        with self._lock:
+            entry = self._local.get(local_key)
+        if entry is None:
+            return _MISSING
+        value, stamp, expires, checked = entry
+        now = time.monotonic()
+        if expires <= now:
+            self._forget(local_key)
+            return _MISSING
+        if now - checked >= self.check_interval:
+            with self._lock:
+                self._count('revalidations')
+            current = self.shared.get(self.version_key(key), version=version)
+            if current != stamp:
+                with self._lock:
+                    self._count('stale')
+                self._forget(local_key)
+                return _MISSING
+            with self._lock:
+                if local_key in self._local:
+                    self._local[local_key] = (value, stamp, expires, now)
+        with self._lock:
+            if local_key in self._local:
+                self._local.move_to_end(local_key)
+        return pickle.loads(value)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version)
+        self.validate_key(local_key)
+        value = self._local_get(key, local_key, version)
+        if value is not _MISSING:
+            with self._lock:
+                self._count('local_hits')
+            return value
+        with self._lock:
+            self._count('local_misses')
+        stored = self.shared.get(key, _MISSING, version=version)
+        if stored is _MISSING:
+            with self._lock:
+                self._count('shared_misses')
+            return default
+        with self._lock:
+            self._count('shared_hits')
+        stamp, value = stored
+        self._remember(local_key, value, stamp)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version)
+        self.validate_key(local_key)
+        stamp = uuid.uuid4().hex
+        self.shared.set_many(
+            {key: (stamp, value), self.version_key(key): stamp},
+            timeout, version=version,
+        )
+        self._remember(local_key, value, stamp, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version)
+        self.validate_key(local_key)
+        stamp = uuid.uuid4().hex
+        # Атомарность — забота общего уровня, см. _check_atomic_add.
+        added = self.shared.add(key, (stamp, value), timeout, version=version)
+        if not added:
+            return False
+        self.shared.set(
+            self.version_key(key), stamp, timeout, version=version
+        )
+        self._remember(local_key, value, stamp, timeout)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = self.shared.touch(key, timeout, version=version)
+        if touched:
+            self.shared.touch(self.version_key(key), timeout, version=version)
+        return touched
+
+    def delete(self, key, version=None):
+        self._forget(self.make_key(key, version))
+        self.shared.delete_many(
+            [key, self.version_key(key)], version=version
+        )
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
@@ -0,0 +1,62 @@
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_local = threading.local()
+
+
+def pin_to_primary():
+    """До конца запроса все чтения идут в основную базу."""
+    _local.pinned = True
+
+
+def mark_written():
+    """Запрос что-то записал: ставим pin-cookie и читаем из default."""
+    _local.wrote = True
+    pin_to_primary()
+
+
+def reset(pinned=False):
+    _local.pinned = pinned
+    _local.wrote = False
+
+
+def is_pinned():
+    return getattr(_local, 'pinned', False)
+
+
+def has_written():
+    return getattr(_local, 'wrote', False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Запись — в default, чтение — в случайную из DATABASE_REPLICAS.
+    После записи (и пока жива cookie от ReplicaPinningMiddleware)
+    чтение тоже идёт в default, чтобы пользователь видел свои изменения.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            not replicas
+            or is_pinned()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        mark_written()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
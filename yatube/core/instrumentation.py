@@ -0,0 +1,177 @@
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+from django.utils.module_loading import import_string
+
+from core.page_cache import PAGE_KEY_PREFIX
+
+_local = threading.local()
+
+
+class RequestStats:
+    """Счётчики и время по фазам обработки одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.thumbnail_time = 0.0
+        self.thumbnails = 0
+        self.cache_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.page_cache_hits = 0
+        self.page_cache_misses = 0
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total_time * 1000, 2),
+            'db_ms': round(self.db_time * 1000, 2),
+            'queries': self.queries,
+            'template_ms': round(self.template_time * 1000, 2),
+            'thumbnail_ms': round(self.thumbnail_time * 1000, 2),
+            'thumbnails': self.thumbnails,
+            'cache_ms': round(self.cache_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def current():
+    """Статистика текущего запроса в этом потоке (или None)."""
+    return getattr(_local, 'stats', None)
+
+
+class collect:
+    """Контекстный менеджер: собирает RequestStats на время запроса."""
+
+    def __enter__(self):
+        self.stats = RequestStats()
+        self.previous = current()
+        _local.stats = self.stats
+        self.stack = ExitStack()
+        for connection in connections.all():
+            self.stack.enter_context(connection.execute_wrapper(self.stats))
+        return self.stats
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+        _local.stats = self.previous
+        return False
+
+
+def _timed_template_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        stats = current()
+        if stats is None:
+            return render(self, context)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - started
+    return wrapper
+
+
+def _timed_thumbnail(get_thumbnail):
+    @wraps(get_thumbnail)
+    def wrapper(*args, **kwargs):
+        stats = current()
+        if stats is None:
+            return get_thumbnail(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return get_thumbnail(*args, **kwargs)
+        finally:
+            stats.thumbnails += 1
+            stats.thumbnail_time += time.perf_counter() - started
+    return wrapper
+
+
+_MISSING = object()
+# Ключи, под которыми cache_page хранит заголовки и сами страницы
+PAGE_HEADER_KEY = 'views.decorators.cache.cache_header.'
+PAGE_KEYS = ('views.decorators.cache.cache_page.', PAGE_KEY_PREFIX)
+
+
+def _count_page_cache(stats, key, hit):
+    """Промах по заголовкам или по странице — промах кеша страниц."""
+    if not isinstance(key, str):
+        return
+    if key.startswith(PAGE_KEYS) and not key.endswith(':lock'):
+        if hit:
+            stats.page_cache_hits += 1
+        else:
+            stats.page_cache_misses += 1
+    elif key.startswith(PAGE_HEADER_KEY) and not hit:
+        stats.page_cache_misses += 1
+
+
+def _counted_cache_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        stats = current()
+        if stats is None:
+            return get(self, key, default, version)
+        started = time.perf_counter()
+        value = get(self, key, _MISSING, version)
+        stats.cache_time += time.perf_counter() - started
+        _count_page_cache(stats, key, value is not _MISSING)
+        if value is _MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _patch(owner, name, decorator):
+    original = getattr(owner, name)
+    if getattr(original, '_instrumented', False):
+        return
+    patched = decorator(original)
+    patched._instrumented = True
+    setattr(owner, name, patched)
+
+
+def install():
+    """
+    Подключает замеры шаблонов, sorl-thumbnail и кеша. Кеши, служащие
+    общим уровнем для TwoTierCache, не считаются, чтобы не учитывать
+    одно обращение дважды.
+    """
+    from sorl.thumbnail.base import ThumbnailBackend
+
+    _patch(Template, 'render', _timed_template_render)
+    _patch(ThumbnailBackend, 'get_thumbnail', _timed_thumbnail)
+    shared = {
+        options.get('OPTIONS', {}).get('SHARED')
+        for options in settings.CACHES.values()
+    }
+    for alias, options in settings.CACHES.items():
+        if alias not in shared:
+            backend = import_string(options['BACKEND'])
+            _patch(backend, 'get', _counted_cache_get)
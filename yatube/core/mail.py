@@ -0,0 +1,125 @@
+import base64
+import logging
+import threading
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from core.tasks import on_idle, task
+
+logger = logging.getLogger('yatube.tasks')
+
+EMAIL_PRIORITY = 10
+
+_local = threading.local()
+
+
+def _attachment(attachment):
+    filename, content, mimetype = attachment
+    if isinstance(content, bytes):
+        return [filename, base64.b64encode(content).decode('ascii'),
+                mimetype, True]
+    return [filename, content, mimetype, False]
+
+
+def serialize(message):
+    """
+    Поля письма для JSON в таблице задач: без pickle, который выполнил бы
+    код любого, кто может писать в эту таблицу. Вложения — только
+    (имя, содержимое, тип), как у EmailMessage.attach().
+    """
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'headers': message.extra_headers,
+        'content_subtype': message.content_subtype,
+        'encoding': message.encoding,
+        'alternatives': [
+            list(alternative)
+            for alternative in getattr(message, 'alternatives', ())
+        ],
+        'attachments': [_attachment(item) for item in message.attachments],
+    }
+
+
+def deserialize(fields):
+    message = EmailMultiAlternatives(
+        subject=fields['subject'],
+        body=fields['body'],
+        from_email=fields['from_email'],
+        to=fields['to'],
+        cc=fields['cc'],
+        bcc=fields['bcc'],
+        reply_to=fields['reply_to'],
+        headers=fields['headers'],
+        alternatives=[tuple(item) for item in fields['alternatives']],
+    )
+    message.content_subtype = fields['content_subtype']
+    message.encoding = fields['encoding']
+    for filename, content, mimetype, encoded in fields['attachments']:
+        if encoded:
+            content = base64.b64decode(content)
+        message.attach(filename, content, mimetype)
+    return message
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Не отправляет письма, а ставит их в очередь задач и сразу
+    возвращает управление. Отправляет runworker через
+    QUEUED_EMAIL_BACKEND, по одному соединению на пачку.
+    С fail_silently письмо, которое не удалось поставить в очередь,
+    пропускается.
+    """
+
+    def send_messages(self, email_messages):
+        queued = 0
+        for message in email_messages:
+            try:
+                deliver.delay(serialize(message))
+            except Exception:
+                if not self.fail_silently:
+                    raise
+                logger.warning('Письмо не поставлено в очередь',
+                               exc_info=True)
+            else:
+                queued += 1
+        return queued
+
+
+def _connection():
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        connection = get_connection(settings.QUEUED_EMAIL_BACKEND)
+        connection.open()
+        _local.connection = connection
+    return connection
+
+
+@on_idle
+def close_connection():
+    """Очередь опустела — закрываем соединение до следующей пачки."""
+    connection = getattr(_local, 'connection', None)
+    _local.connection = None
+    if connection is not None:
+        connection.close()
+
+
+@task(priority=EMAIL_PRIORITY)
+def deliver(fields):
+    """
+    Отправка одного письма через общее для потока соединение.
+    При ошибке соединение закрывается, и повтор откроет новое.
+    """
+    message = deserialize(fields)
+    try:
+        _connection().send_messages([message])
+    except Exception:
+        close_connection()
+        raise
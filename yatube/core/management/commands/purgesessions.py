@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+def purge_expired(batch_size, pause=0):
+    """
+    Удаляет истёкшие сессии пачками по batch_size: каждая пачка —
+    короткая транзакция, а не одна блокировка на всю таблицу, как
+    у clearsessions. Возвращает число удалённых сессий.
+    """
+    now = timezone.now()
+    expired = Session.objects.filter(expire_date__lt=now)
+    total = 0
+    while True:
+        keys = list(
+            expired.values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            return total
+        total += Session.objects.filter(
+            session_key__in=keys, expire_date__lt=now
+        ).delete()[0]
+        if len(keys) < batch_size:
+            return total
+        time.sleep(pause)
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истёкшие сессии небольшими пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.SESSION_PURGE_BATCH_SIZE)
+        parser.add_argument(
+            '--pause', type=float, default=0.1,
+            help='Пауза между пачками, секунд.'
+        )
+
+    def handle(self, *args, **options):
+        total = purge_expired(options['batch_size'], options['pause'])
+        self.stdout.write(f'Удалено сессий: {total}')
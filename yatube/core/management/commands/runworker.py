@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.tasks import Worker
+
+
+def _run_process(name, batch_size, poll_interval, drain):
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    Worker(name, batch_size, poll_interval).run(stop, drain=drain)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди в базе: задачи берутся '
+        'пачками, упавшие повторяются с нарастающей паузой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Сколько обработчиков запустить.'
+        )
+        parser.add_argument(
+            '--mode', choices=('thread', 'process'), default='thread',
+            help='Обработчики — потоки или отдельные процессы.'
+        )
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.TASK_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.TASK_POLL_INTERVAL)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить накопившиеся задачи и выйти.'
+        )
+
+    def handle(self, *args, **options):
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        names = [f'{prefix}:{i}' for i in range(options['concurrency'])]
+        self.stdout.write(
+            f'Запущено обработчиков: {len(names)} ({options["mode"]})'
+        )
+        if options['mode'] == 'process':
+            self.run_processes(names, options)
+        else:
+            self.run_threads(names, options)
+
+    def run_threads(self, names, options):
+        stop = threading.Event()
+        if len(names) == 1:
+            # Один обработчик — прямо в текущем потоке.
+            worker = Worker(
+                names[0], options['batch_size'], options['poll_interval']
+            )
+            try:
+                worker.run(stop, drain=options['once'])
+            except KeyboardInterrupt:
+                pass
+            return
+        threads = [
+            threading.Thread(
+                target=Worker(
+                    name, options['batch_size'], options['poll_interval']
+                ).run,
+                args=(stop, options['once']),
+                name=name,
+            )
+            for name in names
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def run_processes(self, names, options):
+        # Соединения не должны достаться дочерним процессам.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(
+                target=_run_process,
+                args=(
+                    name, options['batch_size'], options['poll_interval'],
+                    options['once'],
+                ),
+                name=name,
+            )
+            for name in names
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+                process.join()
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from core import slow_queries
+
+SORT_KEYS = ('total', 'count', 'max', 'avg')
+
+
+def aggregate(records):
+    """Сводка медленных запросов по отпечатку SQL."""
+    groups = {}
+    for record in records:
+        group = groups.setdefault(record['fingerprint'], {
+            'fingerprint': record['fingerprint'],
+            'sql': record['sql'],
+            'explain': record.get('explain'),
+            'url_names': set(),
+            'count': 0,
+            'total': 0.0,
+            'max': 0.0,
+        })
+        group['count'] += 1
+        group['total'] += record['duration_ms']
+        group['max'] = max(group['max'], record['duration_ms'])
+        if record.get('url_name'):
+            group['url_names'].add(record['url_name'])
+    for group in groups.values():
+        group['avg'] = group['total'] / group['count']
+    return list(groups.values())
+
+
+class Command(BaseCommand):
+    help = 'Сводка журнала медленных SQL-запросов по отпечаткам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Файл журнала.')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--sort', choices=SORT_KEYS, default='total')
+        parser.add_argument(
+            '--explain', action='store_true', help='Показать планы.'
+        )
+
+    def handle(self, *args, **options):
+        groups = aggregate(slow_queries.read(options['path']))
+        if not groups:
+            self.stdout.write('Медленных запросов нет.')
+            return
+        groups.sort(key=lambda group: group[options['sort']], reverse=True)
+        for group in groups[:options['limit']]:
+            self.stdout.write(
+                f'{group["fingerprint"]}  count={group["count"]}  '
+                f'total={group["total"]:.1f}ms  avg={group["avg"]:.1f}ms  '
+                f'max={group["max"]:.1f}ms  '
+                f'views={",".join(sorted(group["url_names"])) or "-"}'
+            )
+            self.stdout.write(f'    {group["sql"]}')
+            if options['explain'] and group['explain']:
+                for line in group['explain']:
+                    self.stdout.write(f'    | {line}')
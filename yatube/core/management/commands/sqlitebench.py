@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.test.utils import override_settings
+
+from core.sqlite import WriteQueue
+
+ALIAS = 'sqlitebench'
+INSERT = 'INSERT INTO bench_write (payload) VALUES (%s)'
+
+
+def _insert(payload):
+    with connections[ALIAS].cursor() as cursor:
+        cursor.execute(INSERT, [payload])
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность конкурентной записи в SQLite: '
+        'без PRAGMA, с настройками SQLITE_PRAGMAS и с очередью записи.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200,
+                            help='Записей на поток.')
+        parser.add_argument('--readers', type=int, default=2)
+        parser.add_argument(
+            '--synchronous', choices=('NORMAL', 'FULL'),
+            help='Переопределить PRAGMA synchronous: с FULL каждая '
+                 'фиксация делает fsync и видна выгода групповой фиксации.'
+        )
+
+    def handle(self, *args, **options):
+        pragmas = dict(settings.SQLITE_PRAGMAS)
+        if options['synchronous']:
+            pragmas['synchronous'] = options['synchronous']
+        with override_settings(SQLITE_PRAGMAS={}):
+            self.report('без PRAGMA', self.run(options, self.direct_write))
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            self.report('WAL + PRAGMA', self.run(options, self.direct_write))
+            queue = WriteQueue(using=ALIAS)
+            self.report('WAL + очередь записи', self.run(
+                options, lambda payload: queue.run(_insert, payload)
+            ))
+
+    @staticmethod
+    def direct_write(payload):
+        with transaction.atomic(using=ALIAS):
+            _insert(payload)
+
+    def run(self, options, write):
+        """Каждый сценарий — на новом файле базы."""
+        directory = tempfile.mkdtemp()
+        connections.databases[ALIAS] = {
+            **connections.databases['default'],
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory, 'bench.sqlite3'),
+        }
+        connections.ensure_defaults(ALIAS)
+        connections.prepare_test_settings(ALIAS)
+        try:
+            with connections[ALIAS].cursor() as cursor:
+                cursor.execute(
+                    'CREATE TABLE bench_write '
+                    '(id INTEGER PRIMARY KEY, payload TEXT)'
+                )
+            connections[ALIAS].close()
+            return self.run_threads(options, write)
+        finally:
+            connections[ALIAS].close()
+            del connections[ALIAS]
+            del connections.databases[ALIAS]
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run_threads(self, options, write):
+        self.counters = {'ok': 0, 'locked': 0, 'reads': 0}
+        self.lock = threading.Lock()
+        self.stop_readers = threading.Event()
+        readers = [
+            threading.Thread(target=self.reader)
+            for _ in range(options['readers'])
+        ]
+        writers = [
+            threading.Thread(
+                target=self.writer, args=(write, number, options['writes'])
+            )
+            for number in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        self.stop_readers.set()
+        for thread in readers:
+            thread.join()
+        return {**self.counters, 'elapsed': elapsed}
+
+    def count(self, result):
+        with self.lock:
+            self.counters[result] += 1
+
+    def writer(self, write, number, writes):
+        for index in range(writes):
+            try:
+                write(f'{number}-{index}')
+            except OperationalError:
+                self.count('locked')
+            else:
+                self.count('ok')
+        connections[ALIAS].close()
+
+    def reader(self):
+        while not self.stop_readers.is_set():
+            try:
+                with connections[ALIAS].cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM bench_write')
+                    cursor.fetchone()
+            except OperationalError:
+                continue
+            self.count('reads')
+        connections[ALIAS].close()
+
+    def report(self, title, result):
+        self.stdout.write(
+            f'{title:<22} '
+            f'записей/с: {result["ok"] / result["elapsed"]:>8.0f}  '
+            f'чтений/с: {result["reads"] / result["elapsed"]:>8.0f}  '
+            f'locked: {result["locked"]}'
+        )
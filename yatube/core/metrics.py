@@ -0,0 +1,305 @@
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Сумма снимков завершившихся процессов.
+DEAD_SNAPSHOT = 'dead.json'
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (
+    10 * 1024, 100 * 1024, 512 * 1024, 1024 ** 2, 5 * 1024 ** 2,
+    10 * 1024 ** 2,
+)
+
+
+def _labels_key(labels):
+    return json.dumps(sorted(labels.items()), ensure_ascii=False)
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in pairs
+    )
+    return '{' + body + '}'
+
+
+def _snapshot_pid(path):
+    """pid из имени снимка <pid>-<запуск>.json; None для чужих файлов."""
+    pid = os.path.basename(path).split('-')[0].split('.')[0]
+    return int(pid) if pid.isdigit() else None
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as snapshot:
+            return json.load(snapshot)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(directory, name, data):
+    descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as snapshot:
+        json.dump(data, snapshot)
+    os.replace(path, os.path.join(directory, name))
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, registry, name, documentation):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.samples = {}
+
+    def inc(self, amount=1, **labels):
+        key = _labels_key(labels)
+        with self.registry.lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+    def dump(self):
+        return dict(self.samples)
+
+    @staticmethod
+    def merge(target, samples):
+        for key, value in samples.items():
+            target[key] = target.get(key, 0) + value
+
+    def expose(self, samples):
+        for key, value in sorted(samples.items()):
+            labels = _format_labels(json.loads(key))
+            yield f'{self.name}{labels} {_format_value(value)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation,
+                 buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.samples = {}
+
+    def observe(self, value, **labels):
+        key = _labels_key(labels)
+        with self.registry.lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                sample = self.samples[key] = {
+                    'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0,
+                }
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample['buckets'][index] += 1
+                    break
+            sample['sum'] += value
+            sample['count'] += 1
+
+    def dump(self):
+        return {
+            key: {**sample, 'buckets': list(sample['buckets'])}
+            for key, sample in self.samples.items()
+        }
+
+    @staticmethod
+    def merge(target, samples):
+        for key, sample in samples.items():
+            current = target.setdefault(key, {
+                'buckets': [0] * len(sample['buckets']), 'sum': 0, 'count': 0,
+            })
+            for index, count in enumerate(sample['buckets']):
+                current['buckets'][index] += count
+            current['sum'] += sample['sum']
+            current['count'] += sample['count']
+
+    def expose(self, samples):
+        for key, sample in sorted(samples.items()):
+            pairs = json.loads(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, sample['buckets']):
+                cumulative += count
+                labels = _format_labels(pairs + [['le', _format_value(bound)]])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(pairs)
+            yield f'{self.name}_sum{labels} {_format_value(sample["sum"])}'
+            yield f'{self.name}_count{labels} {sample["count"]}'
+
+
+class Registry:
+    """
+    Метрики процесса. Если задан каталог, каждый воркер сбрасывает туда
+    свой снимок, а выдача суммирует снимки всех воркеров. Снимок назван
+    по pid и id запуска процесса: процесс с переиспользованным pid
+    не затирает итоги предшественника.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.last_flush = 0.0
+        self.pid = None
+        self.start_id = None
+
+    def counter(self, name, documentation):
+        return self._register(Counter(self, name, documentation))
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, buckets))
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def dump(self):
+        with self.lock:
+            return {
+                name: metric.dump() for name, metric in self.metrics.items()
+            }
+
+    def snapshot_name(self):
+        # После fork у потомка новый pid — и новый id запуска.
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.start_id = uuid.uuid4().hex[:12]
+        return f'{self.pid}-{self.start_id}.json'
+
+    def flush(self, directory):
+        """Атомарно записывает снимок процесса в каталог."""
+        os.makedirs(directory, exist_ok=True)
+        _write(directory, self.snapshot_name(), self.dump())
+        self.last_flush = time.monotonic()
+
+    def mark_process_dead(self, directory, pid, keep=None):
+        """
+        Как mark_process_dead в prometheus_client: снимки завершившегося
+        процесса pid (кроме keep) прибавляются к dead.json и удаляются.
+        Счётчики в сумме не убывают, а файлов не больше, чем живых
+        процессов. Слияние идёт под flock, чтобы два сборщика не учли
+        один снимок дважды.
+        """
+        with open(os.path.join(directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            paths = [
+                path for path in glob.glob(
+                    os.path.join(directory, f'{pid}-*.json')
+                ) + glob.glob(os.path.join(directory, f'{pid}.json'))
+                if os.path.basename(path) != keep
+            ]
+            if not paths:
+                return 0
+            merged = self._merge(
+                [os.path.join(directory, DEAD_SNAPSHOT)] + paths
+            )
+            _write(directory, DEAD_SNAPSHOT, merged)
+            for path in paths:
+                os.remove(path)
+        return len(paths)
+
+    def cleanup(self, directory):
+        """
+        Сворачивает снимки мёртвых процессов. Если pid занят новым
+        процессом, его снимок — самый свежий, а старые сворачиваются.
+        """
+        by_pid = defaultdict(list)
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            pid = _snapshot_pid(path)
+            if pid is not None:
+                by_pid[pid].append(path)
+        for pid, paths in by_pid.items():
+            keep = None
+            if _is_alive(pid):
+                if len(paths) < 2:
+                    continue
+                keep = os.path.basename(max(paths, key=os.path.getmtime))
+            self.mark_process_dead(directory, pid, keep)
+
+    def _merge(self, paths):
+        merged = {name: {} for name in self.metrics}
+        for path in paths:
+            data = _read(path)
+            if data is None:
+                continue
+            for name, samples in data.items():
+                metric = self.metrics.get(name)
+                if metric is not None:
+                    metric.merge(merged[name], samples)
+        return merged
+
+    def maybe_flush(self, directory, interval):
+        if directory and time.monotonic() - self.last_flush >= interval:
+            self.flush(directory)
+
+    def collect(self, directory=None):
+        if not directory:
+            return self.dump()
+        self.flush(directory)
+        self.cleanup(directory)
+        return self._merge(glob.glob(os.path.join(directory, '*.json')))
+
+    def expose(self, directory=None):
+        """Текст в формате Prometheus text exposition 0.0.4."""
+        lines = []
+        for name, samples in self.collect(directory).items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            lines.extend(metric.expose(samples))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    'yatube_request_duration_seconds', 'Время обработки запроса.'
+)
+REQUESTS = registry.counter(
+    'yatube_requests_total', 'Запросы по имени URL и коду ответа.'
+)
+DB_QUERIES = registry.histogram(
+    'yatube_db_queries_per_request', 'SQL-запросов на один запрос.',
+    QUERY_BUCKETS,
+)
+PAGE_CACHE = registry.counter(
+    'yatube_page_cache_requests_total', 'Обращения к кешу cache_page.'
+)
+THUMBNAIL_DURATION = registry.histogram(
+    'yatube_thumbnail_seconds', 'Время работы sorl-thumbnail за запрос.'
+)
+UPLOAD_SIZE = registry.histogram(
+    'yatube_upload_size_bytes', 'Размер загруженных файлов.', SIZE_BUCKETS
+)
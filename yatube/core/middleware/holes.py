@@ -0,0 +1,25 @@
+from core import holes
+
+
+class HoleMiddleware:
+    """
+    Заполняет дырки в HTML-ответах, в том числе взятых из общего кеша.
+    Стоит после AuthenticationMiddleware и до CsrfViewMiddleware
+    на пути ответа, чтобы фрагменты видели пользователя и ставили
+    CSRF-cookie.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            not response.streaming
+            and response.get('Content-Type', '').startswith('text/html')
+            and b'<!--hole:' in response.content
+        ):
+            response.content = holes.fill(
+                request, response.content, response.charset
+            )
+        return response
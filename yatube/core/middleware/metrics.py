@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+
+from core import instrumentation, metrics
+
+
+class MetricsMiddleware:
+    """
+    Пополняет реестр core.metrics. Ставится после ServerTimingMiddleware,
+    чтобы пользоваться уже собранной статистикой запроса.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrumentation.install()
+
+    def __call__(self, request):
+        stats = instrumentation.current()
+        if stats is None:
+            with instrumentation.collect() as stats:
+                return self.record(request, stats)
+        return self.record(request, stats)
+
+    def record(self, request, stats):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.view_name if match else 'unresolved'
+        metrics.REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            url_name=url_name, method=request.method,
+        )
+        metrics.REQUESTS.inc(url_name=url_name, status=response.status_code)
+        metrics.DB_QUERIES.observe(stats.queries, url_name=url_name)
+        if stats.page_cache_hits:
+            metrics.PAGE_CACHE.inc(
+                stats.page_cache_hits, url_name=url_name, result='hit'
+            )
+        if stats.page_cache_misses:
+            metrics.PAGE_CACHE.inc(
+                stats.page_cache_misses, url_name=url_name, result='miss'
+            )
+        if stats.thumbnails:
+            metrics.THUMBNAIL_DURATION.observe(
+                stats.thumbnail_time, url_name=url_name
+            )
+        if request.method == 'POST' and request.FILES:
+            for upload in request.FILES.values():
+                metrics.UPLOAD_SIZE.observe(upload.size, url_name=url_name)
+        metrics.registry.maybe_flush(
+            settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL
+        )
+        return response
@@ -0,0 +1,40 @@
+import random
+
+from django.conf import settings
+
+from core.profiling import MODES, profile_call
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует view сотрудников: по заголовку X-Profile (cprofile|sample)
+    или для случайной доли их запросов PROFILING_SAMPLE_RATE. Запросы
+    остальных пользователей не профилируются никогда.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def _mode(self, request):
+        if not request.user.is_staff:
+            return None
+        mode = request.META.get(PROFILE_HEADER)
+        if mode:
+            return mode if mode in MODES else settings.PROFILING_MODE
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            return settings.PROFILING_MODE
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mode = self._mode(request)
+        if mode is None:
+            return None
+        return profile_call(
+            mode, request.resolver_match.view_name,
+            view_func, request, *view_args, **view_kwargs
+        )
@@ -0,0 +1,31 @@
+from django.conf import settings
+
+from core import db_router
+
+PIN_COOKIE = 'pin_primary'
+
+
+class ReplicaPinningMiddleware:
+    """
+    Переносит «только что писал» между запросами: после записи ставит
+    короткоживущую cookie, и пока она есть, чтения идут в default.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        db_router.reset(pinned=PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = db_router.has_written()
+            db_router.reset()
+        if wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
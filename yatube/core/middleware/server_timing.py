@@ -0,0 +1,72 @@
+import json
+import logging
+import random
+
+from django.conf import settings
+
+from core import instrumentation
+from core.query_budget import get_budget
+
+logger = logging.getLogger('yatube.performance')
+
+
+def _url_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else None
+
+
+def _should_expose(request):
+    """Заголовок видят сотрудники и случайная доля пользователей."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    return random.random() < settings.SERVER_TIMING_SAMPLE_RATE
+
+
+def server_timing_header(stats):
+    metrics = (
+        ('db', stats.db_time, f'{stats.queries} queries'),
+        ('tpl', stats.template_time, 'templates'),
+        ('thumb', stats.thumbnail_time, f'{stats.thumbnails} thumbnails'),
+        (
+            'cache',
+            stats.cache_time,
+            f'hits={stats.cache_hits} misses={stats.cache_misses}'
+        ),
+        ('total', stats.total_time, 'total'),
+    )
+    return ', '.join(
+        f'{name};dur={duration * 1000:.2f};desc="{desc}"'
+        for name, duration, desc in metrics
+    )
+
+
+class ServerTimingMiddleware:
+    """
+    Замеряет БД, шаблоны, sorl-thumbnail и кеш для каждого запроса,
+    пишет итог в лог yatube.performance и отдаёт его в Server-Timing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrumentation.install()
+
+    def __call__(self, request):
+        with instrumentation.collect() as stats:
+            response = self.get_response(request)
+        url_name = _url_name(request)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'url_name': url_name,
+            'status': response.status_code,
+            **stats.as_dict(),
+        }
+        budget = get_budget(url_name)
+        if budget is not None and stats.queries > budget:
+            logger.warning(json.dumps({'over_budget': budget, **record}))
+        else:
+            logger.info(json.dumps(record))
+        if _should_expose(request):
+            response['Server-Timing'] = server_timing_header(stats)
+        return response
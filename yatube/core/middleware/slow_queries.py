@@ -0,0 +1,20 @@
+from contextlib import ExitStack
+
+from django.db import connections
+
+from core.slow_queries import SlowQueryLog
+
+
+class SlowQueryMiddleware:
+    """Пишет медленные запросы вместе с именем URL, который их вызвал."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    SlowQueryLog(connection, request)
+                ))
+            return self.get_response(request)
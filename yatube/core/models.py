@@ -0,0 +1,68 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """Фоновая задача в очереди; выполненные удаляются."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=200, verbose_name='Задача')
+    payload = models.TextField(
+        default='{}',
+        verbose_name='Аргументы',
+        help_text='JSON: {"args": [...], "kwargs": {...}}'
+    )
+    priority = models.SmallIntegerField(
+        default=0,
+        verbose_name='Приоритет',
+        help_text='Задачи с большим приоритетом выполняются раньше'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=QUEUED,
+        verbose_name='Состояние',
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Выполнить не раньше',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Неудачных попыток',
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=5,
+        verbose_name='Всего попыток',
+    )
+    locked_by = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Обработчик',
+    )
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Взята в работу',
+    )
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Поставлена в очередь',
+    )
+
+    def __str__(self) -> str:
+        return f'{self.name} ({self.status})'
+
+    class Meta:
+        ordering = ['-priority', 'run_at']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at']),
+        ]
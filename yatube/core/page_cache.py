@@ -0,0 +1,243 @@
+import hashlib
+import logging
+import math
+import random
+import time
+import uuid
+from functools import partial, wraps
+
+from django.core.cache import cache as default_cache
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.utils.cache import patch_response_headers
+
+PAGE_KEY_PREFIX = 'page:'
+VERSION_KEY_PREFIX = 'page_version:'
+# Область, от которой зависят все страницы с versioned_page_key.
+ALL_PAGES = 'all'
+LOCK_TIMEOUT = 10
+WAIT_TIMEOUT = 2
+POLL_INTERVAL = 0.05
+RECOVERY_DELAY = 1
+RECOVERY_MAX_DELAY = 60
+CACHE_HEADER = 'X-Cache'
+HIT, MISS, STALE = 'HIT', 'MISS', 'STALE'
+# Ответы об ошибке клиента — не сбой бэкенда, копию вместо них не отдаём.
+CLIENT_ERRORS = (Http404, PermissionDenied)
+
+logger = logging.getLogger('yatube.performance')
+
+
+def _is_fresh(entry, now, beta):
+    """
+    Вероятностное досрочное обновление (XFetch): чем дороже пересчёт
+    и ближе срок, тем вероятнее, что запрос возьмётся обновлять заранее.
+    """
+    if beta <= 0:
+        return now < entry['expires']
+    jitter = entry['delta'] * beta * -math.log(1 - random.random())
+    return now + jitter < entry['expires']
+
+
+def _wait_for(cache, key, deadline):
+    while time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _store(cache, key, compute, timeout, stale_timeout, cacheable):
+    started = time.time()
+    value = compute()
+    if cacheable is None or cacheable(value):
+        finished = time.time()
+        cache.set(key, {
+            'value': value,
+            'expires': finished + timeout,
+            'delta': finished - started,
+        }, timeout + stale_timeout)
+    return value
+
+
+def _build_and_unlock(cache, lock_key, build):
+    try:
+        return build()
+    finally:
+        cache.delete(lock_key)
+
+
+def _back_off(cache, key):
+    """
+    Пересчёт упал: блокировка остаётся на нарастающую паузу, и запросы
+    в это время сразу получают устаревшую копию, не ходя в базу. После
+    паузы пересчёт повторит обычный запрос — в своём потоке, со своими
+    привязкой к основной базе и учётом запросов.
+    """
+    failures_key = f'{key}:failures'
+    failures = (cache.get(failures_key) or 0) + 1
+    delay = min(RECOVERY_DELAY * 2 ** (failures - 1), RECOVERY_MAX_DELAY)
+    cache.set(failures_key, failures, RECOVERY_MAX_DELAY * 2)
+    cache.add(f'{key}:lock', 1, delay)
+
+
+def _while_locked(cache, key, entry, compute, now):
+    """Пересчёт уже идёт: отдаём копию или недолго ждём новую."""
+    if entry is not None:
+        return entry['value'], STALE
+    entry = _wait_for(cache, key, now + WAIT_TIMEOUT)
+    if entry is not None:
+        return entry['value'], HIT
+    return compute(), MISS
+
+
+def lookup(key, compute, timeout, stale_timeout=None, beta=1.0,
+           cacheable=None, cache=None, serve_stale_on_error=False):
+    """
+    Как get_or_compute, но возвращает пару (значение, состояние):
+    HIT, MISS или STALE — устаревшая копия вместо свежей.
+
+    serve_stale_on_error: если пересчёт упал, отдать устаревшую копию,
+    а следующую попытку сделать после паузы (см. _back_off).
+    """
+    cache = cache or default_cache
+    stale_timeout = timeout if stale_timeout is None else stale_timeout
+    now = time.time()
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry, now, beta):
+        return entry['value'], HIT
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        return _while_locked(cache, key, entry, compute, now)
+    build = partial(
+        _store, cache, key, compute, timeout, stale_timeout, cacheable
+    )
+    try:
+        value = _build_and_unlock(cache, lock_key, build)
+    except CLIENT_ERRORS:
+        raise
+    except Exception:
+        if not serve_stale_on_error or entry is None:
+            raise
+        logger.warning('Отдана устаревшая копия %s', key, exc_info=True)
+        _back_off(cache, key)
+        return entry['value'], STALE
+    if serve_stale_on_error:
+        cache.delete(f'{key}:failures')
+    return value, MISS
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=None, beta=1.0,
+                   cacheable=None, cache=None):
+    """
+    Кеширование с защитой от «набега»: пересчитывает только тот запрос,
+    что взял короткую блокировку; остальные получают устаревшую копию
+    или недолго ждут новую. Копия хранится timeout + stale_timeout
+    секунд, свежей считается timeout.
+    """
+    value, _ = lookup(
+        key, compute, timeout, stale_timeout=stale_timeout, beta=beta,
+        cacheable=cacheable, cache=cache,
+    )
+    return value
+
+
+def _path_digest(request):
+    return hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+
+def page_key(request):
+    """Ключ страницы: полный путь и пользователь (аноним — общий ключ)."""
+    user = getattr(request, 'user', None)
+    owner = user.pk if user is not None and user.is_authenticated else 'anon'
+    return f'{PAGE_KEY_PREFIX}{_path_digest(request)}:{owner}'
+
+
+def shared_page_key(request):
+    """
+    Ключ страницы, одной на всех: части конкретного пользователя
+    в ней — дырки, их заполняет HoleMiddleware (см. core.holes).
+    """
+    return f'{PAGE_KEY_PREFIX}{_path_digest(request)}:shared'
+
+
+def page_versions(scopes):
+    """Текущие версии областей; недостающие создаются."""
+    keys = [f'{VERSION_KEY_PREFIX}{scope}' for scope in scopes]
+    versions = default_cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            value = uuid.uuid4().hex
+            if not default_cache.add(key, value, None):
+                value = default_cache.get(key, value)
+            versions[key] = value
+    return [versions[key] for key in keys]
+
+
+def invalidate_pages(*scopes):
+    """
+    Сбрасывает страницы, зависящие от областей scopes (например,
+    'post:5'); без аргументов — все страницы с versioned_page_key.
+    """
+    default_cache.set_many({
+        f'{VERSION_KEY_PREFIX}{scope}': uuid.uuid4().hex
+        for scope in scopes or (ALL_PAGES,)
+    }, None)
+
+
+def versioned_page_key(scopes=None):
+    """
+    key_func для cache_page_coalesced: как shared_page_key, но страница
+    устаревает, когда invalidate_pages сбрасывает одну из её областей.
+    scopes(**kwargs) получает аргументы из URL и возвращает области.
+    """
+    def key_func(request):
+        names = [ALL_PAGES]
+        match = getattr(request, 'resolver_match', None)
+        if scopes is not None and match is not None:
+            names.extend(scopes(**match.kwargs))
+        digest = hashlib.md5(
+            ':'.join(page_versions(names)).encode()
+        ).hexdigest()
+        return f'{shared_page_key(request)}:{digest}'
+    return key_func
+
+
+def _cacheable_response(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def cache_page_coalesced(timeout, stale_timeout=None, beta=1.0,
+                         serve_stale_on_error=False, key_func=page_key):
+    """
+    Аналог cache_page: страницу пересобирает один запрос, остальные
+    получают прежнюю копию или ждут; возможен досрочный пересчёт.
+    Как и cache_page, ставит Cache-Control: max-age и Expires.
+    Состояние копии — в заголовке X-Cache, параметры деградации —
+    как у lookup. key_func задаёт, кто делит копию страницы.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            def build():
+                response = view(request, *args, **kwargs)
+                if callable(getattr(response, 'render', None)):
+                    response = response.render()
+                if timeout and _cacheable_response(response):
+                    patch_response_headers(response, timeout)
+                return response
+
+            response, state = lookup(
+                key_func(request), build, timeout,
+                stale_timeout=stale_timeout, beta=beta,
+                cacheable=_cacheable_response,
+                serve_stale_on_error=serve_stale_on_error,
+            )
+            response[CACHE_HEADER] = state
+            return response
+        return wrapper
+    return decorator
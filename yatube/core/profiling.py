@@ -0,0 +1,96 @@
+import cProfile
+import os
+import sys
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+MODES = ('cprofile', 'sample')
+
+
+class StackSampler:
+    """
+    Снимает стек профилируемого потока из отдельного потока
+    с заданным интервалом; на сам запрос почти не влияет.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            filename = os.path.basename(code.co_filename)
+            names.append(f'{code.co_name} ({filename}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def collapsed(self):
+        """Формат collapsed stacks для flamegraph.pl и speedscope."""
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items()
+        )
+
+
+def _collapsed_from_profile(profile):
+    """Свёртка cProfile: пары вызывающий;вызываемый с весом в мкс."""
+    profile.create_stats()
+    lines = []
+    for (filename, line, name), stats in profile.stats.items():
+        callee = f'{name} ({os.path.basename(filename)}:{line})'
+        for caller, caller_stats in stats[4].items():
+            caller_name = (
+                f'{caller[2]} ({os.path.basename(caller[0])}:{caller[1]})'
+            )
+            weight = int(caller_stats[2] * 1_000_000)
+            if weight:
+                lines.append(f'{caller_name};{callee} {weight}\n')
+    return ''.join(lines)
+
+
+def _output_path(url_name, extension):
+    directory = os.path.join(
+        settings.PROFILING_DIR, (url_name or 'unresolved').replace(':', '.')
+    )
+    os.makedirs(directory, exist_ok=True)
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S-%f')
+    return os.path.join(directory, f'{stamp}-{os.getpid()}.{extension}')
+
+
+def profile_call(mode, url_name, func, *args, **kwargs):
+    """Вызывает func под профайлером и сохраняет результаты на диск."""
+    if mode == 'cprofile':
+        profile = cProfile.Profile()
+        result = profile.runcall(func, *args, **kwargs)
+        profile.dump_stats(_output_path(url_name, 'prof'))
+        collapsed = _collapsed_from_profile(profile)
+    else:
+        with StackSampler(settings.PROFILING_SAMPLE_INTERVAL) as sampler:
+            result = func(*args, **kwargs)
+        collapsed = sampler.collapsed()
+    with open(_output_path(url_name, 'collapsed'), 'w') as output:
+        output.write(collapsed)
+    return result
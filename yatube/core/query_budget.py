@@ -0,0 +1,105 @@
+import os
+import traceback
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.urls import resolve
+
+STACK_LIMIT = 6
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Страница выполнила больше запросов, чем ей разрешено."""
+
+
+def get_budget(url_name):
+    """Возвращает лимит запросов для имени URL (или None)."""
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(url_name)
+
+
+def _template_line(frames):
+    """Ищет ближайший узел шаблона, который вызвал запрос."""
+    for frame, _ in frames:
+        node = frame.f_locals.get('self')
+        if frame.f_code.co_name != 'render_annotated' or node is None:
+            continue
+        token = getattr(node, 'token', None)
+        origin = getattr(node, 'origin', None)
+        if token is not None and origin is not None:
+            return f'{origin.template_name}:{token.lineno}'
+    return None
+
+
+def _project_stack():
+    """Стек вызовов без фреймов Django и сторонних библиотек."""
+    stack = []
+    for entry in traceback.extract_stack():
+        filename = os.path.abspath(entry.filename)
+        if not filename.startswith(settings.BASE_DIR):
+            continue
+        if os.path.abspath(__file__) == filename:
+            continue
+        stack.append(f'{filename}:{entry.lineno} in {entry.name}')
+    return stack[-STACK_LIMIT:]
+
+
+class QueryLog:
+    """Запросы, перехваченные через connection.execute_wrapper."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        frames = list(traceback.walk_stack(None))
+        self.queries.append({
+            'sql': sql,
+            'template': _template_line(frames),
+            'stack': _project_stack(),
+        })
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def report(self):
+        lines = []
+        for number, query in enumerate(self.queries, start=1):
+            lines.append(f'{number}. {query["sql"]}')
+            if query['template']:
+                lines.append(f'   шаблон: {query["template"]}')
+            lines.extend(f'   {frame}' for frame in query['stack'])
+        return '\n'.join(lines)
+
+
+@contextmanager
+def capture_queries(using=connection):
+    log = QueryLog()
+    with using.execute_wrapper(log):
+        yield log
+
+
+def check_budget(url_name, log):
+    """Бросает QueryBudgetExceeded, если запросов больше лимита."""
+    budget = get_budget(url_name)
+    if budget is None or len(log) <= budget:
+        return
+    raise QueryBudgetExceeded(
+        f'{url_name}: {len(log)} запросов при лимите {budget}\n'
+        f'{log.report()}'
+    )
+
+
+class QueryBudgetMixin:
+    """Проверки лимита запросов для django.test.TestCase."""
+
+    def assertQueryBudget(self, client, url, url_name=None):
+        url_name = url_name or resolve(url).view_name
+        self.assertIsNotNone(
+            get_budget(url_name),
+            f'Для {url_name} не задан лимит в settings.QUERY_BUDGETS'
+        )
+        with capture_queries() as log:
+            response = client.get(url)
+        check_budget(url_name, log)
+        return response
@@ -0,0 +1,182 @@
+import hashlib
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.lookups import Exact
+from django.db.models.signals import post_delete, post_save
+
+KEY_PREFIX = 'qs:'
+STAMP_PREFIX = 'qs_stamp:'
+
+
+def _stamp_keys(table, pk=None):
+    """
+    Версии таблицы: table меняется при любой записи, rows — при записи,
+    которую нельзя привязать к строкам (update(), bulk_*), row:<pk> —
+    при сохранении или удалении строки.
+    """
+    if pk is None:
+        return [f'{STAMP_PREFIX}{table}:table']
+    return [f'{STAMP_PREFIX}{table}:rows', f'{STAMP_PREFIX}{table}:row:{pk}']
+
+
+def _stamps(keys):
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            # Потерянную версию заменяем новой, а не нулём: иначе
+            # уцелевшие в кеше результаты снова стали бы «свежими».
+            cache.add(key, uuid.uuid4().hex, None)
+            stamps[key] = cache.get(key)
+    return [stamps[key] for key in keys]
+
+
+def bulk_version(table):
+    """
+    Версия, которая меняется только при записи мимо сигналов:
+    update(), bulk_create() и удалении без загрузки объектов.
+    """
+    return _stamps([f'{STAMP_PREFIX}{table}:rows'])[0]
+
+
+def _bump(keys):
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+
+def invalidate_table(table):
+    """Сбрасывает все закешированные выборки из таблицы."""
+    _bump([
+        f'{STAMP_PREFIX}{table}:table', f'{STAMP_PREFIX}{table}:rows'
+    ])
+
+
+def invalidate_row(table, pk):
+    """Сбрасывает выборки из таблицы, кроме поиска других строк по pk."""
+    _bump([
+        f'{STAMP_PREFIX}{table}:table', f'{STAMP_PREFIX}{table}:row:{pk}'
+    ])
+
+
+def _row_changed(sender, instance, using, **kwargs):
+    # До фиксации другие соединения и реплики видят старую строку и
+    # закешировали бы её под новой версией — сбрасываем после фиксации.
+    transaction.on_commit(
+        partial(invalidate_row, sender._meta.db_table, instance.pk),
+        using=using,
+    )
+
+
+def watch(*models):
+    """
+    Подключает сброс кеша к сохранению и удалению объектов моделей;
+    версии меняются после фиксации транзакции.
+    Запись через CachedQuerySet (update(), bulk_*) сбрасывает кеш сама.
+    """
+    for model in models:
+        post_save.connect(_row_changed, sender=model)
+        post_delete.connect(_row_changed, sender=model)
+
+
+class CachedQuerySet(QuerySet):
+    """
+    QuerySet с кешированием по запросу: qs.cache(timeout) кладёт
+    результат в кеш под ключом из нормализованного SQL, параметров и
+    версий затронутых таблиц. Поиск по первичному ключу в одной таблице
+    зависит только от версии своей строки.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_timeout = None
+
+    def cache(self, timeout=None):
+        clone = self._chain()
+        if timeout is None:
+            timeout = settings.QUERYSET_CACHE_TIMEOUT
+        clone._cache_timeout = timeout
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def _row_pk(self, query):
+        """pk, если запрос — поиск одной строки по первичному ключу."""
+        if len(query.alias_map) != 1 or len(query.where.children) != 1:
+            return None
+        lookup = query.where.children[0]
+        if (
+            isinstance(lookup, Exact)
+            and getattr(lookup.lhs, 'target', None) == self.model._meta.pk
+        ):
+            return lookup.rhs
+        return None
+
+    def _cache_key(self, suffix=''):
+        query = self.query.chain()
+        try:
+            sql, params = query.get_compiler(using=self.db).as_sql()
+        except EmptyResultSet:
+            return None
+        pk = self._row_pk(query)
+        if pk is None:
+            tables = sorted({
+                join.table_name for join in query.alias_map.values()
+            })
+            keys = [key for table in tables for key in _stamp_keys(table)]
+        else:
+            keys = _stamp_keys(self.model._meta.db_table, pk)
+        source = ' '.join([self.db, *sql.split(), repr(params), suffix])
+        source += ':'.join(_stamps(keys))
+        return KEY_PREFIX + hashlib.md5(source.encode()).hexdigest()
+
+    def _cached(self, suffix, compute):
+        key = self._cache_key(suffix) if self._cache_timeout else None
+        if key is None:
+            return compute()
+        result = cache.get(key)
+        if result is None:
+            result = compute()
+            cache.set(key, result, self._cache_timeout)
+        return result
+
+    def _fetch_all(self):
+        if self._result_cache is None and self._cache_timeout:
+            self._result_cache = self._cached(
+                '', lambda: list(self._iterable_class(self))
+            )
+        super()._fetch_all()
+
+    def count(self):
+        if self._result_cache is not None or not self._cache_timeout:
+            return super().count()
+        return self._cached(':count', super().count)
+
+    def _invalidate(self):
+        transaction.on_commit(
+            partial(invalidate_table, self.model._meta.db_table),
+            using=self.db,
+        )
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        self._invalidate()
+        return rows
+
+    update.alters_data = True
+
+    def _raw_delete(self, using):
+        rows = super()._raw_delete(using)
+        self._invalidate()
+        return rows
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super().bulk_create(*args, **kwargs)
+        self._invalidate()
+        return objs
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.utils import timezone
+
+PARAMS_SAMPLE = 5
+PARAM_LENGTH = 100
+
+_local = threading.local()
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """Приводит SQL к виду без литералов и длины списков IN (...)."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+def _sample_params(params):
+    if params is None:
+        return []
+    return [
+        repr(param)[:PARAM_LENGTH] for param in list(params)[:PARAMS_SAMPLE]
+    ]
+
+
+def _explain(connection, sql, params):
+    """План запроса; внутренние запросы сами в лог не попадают."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'{connection.ops.explain_query_prefix()} {sql}', params
+            )
+            return [' '.join(map(str, row)) for row in cursor.fetchall()]
+    except Exception as error:
+        return [f'EXPLAIN недоступен: {error}']
+    finally:
+        _local.explaining = False
+
+
+def _handler(path):
+    with _handlers_lock:
+        handler = _handlers.get(path)
+        if handler is None:
+            handler = _handlers[path] = RotatingFileHandler(
+                path,
+                maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+                encoding='utf-8',
+                delay=True,
+            )
+        return handler
+
+
+def write(record, path=None):
+    """Дописывает запись в ротируемый файл JSON-строк."""
+    handler = _handler(path or settings.SLOW_QUERY_LOG)
+    handler.handle(logging.makeLogRecord(
+        {'msg': json.dumps(record, ensure_ascii=False)}
+    ))
+
+
+def read(path=None):
+    """Записи из основного файла и его ротированных копий."""
+    path = path or settings.SLOW_QUERY_LOG
+    paths = [path] + [
+        f'{path}.{number}'
+        for number in range(1, settings.SLOW_QUERY_LOG_BACKUPS + 1)
+    ]
+    for name in paths:
+        try:
+            with open(name, encoding='utf-8') as log:
+                lines = log.readlines()
+        except FileNotFoundError:
+            continue
+        for line in lines:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class SlowQueryLog:
+    """Обёртка execute, записывающая запросы дольше порога."""
+
+    def __init__(self, connection, request=None):
+        self.connection = connection
+        self.request = request
+
+    def url_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - started) * 1000
+        if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+            write({
+                'time': timezone.now().isoformat(),
+                'url_name': self.url_name(),
+                'path': getattr(self.request, 'path', None),
+                'duration_ms': round(duration, 2),
+                'fingerprint': fingerprint(sql),
+                'sql': normalize(sql),
+                'params': [] if many else _sample_params(params),
+                'explain': None if many else _explain(
+                    self.connection, sql, params
+                ),
+            })
+        return result
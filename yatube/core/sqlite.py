@@ -0,0 +1,104 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core import db_router
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Обработчик connection_created: настройки SQLite для продакшена."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+class WriteQueue:
+    """
+    Очередь записей в один поток: задания выполняются по очереди
+    и фиксируются группами до batch_size штук в одной транзакции,
+    каждое — в своей точке сохранения.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, batch_size=20, max_wait=0):
+        self.using = using
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.jobs = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self.jobs.put((future, func, args, kwargs))
+        self._ensure_worker()
+        return future
+
+    def run(self, func, *args, **kwargs):
+        return self.submit(func, *args, **kwargs).result()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._work, name='sqlite-writer', daemon=True
+                )
+                self._thread.start()
+
+    def _next_batch(self):
+        """Первое задание ждём, остальные — только уже накопившиеся."""
+        batch = [self.jobs.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.jobs.get(
+                    block=self.max_wait > 0, timeout=self.max_wait or None
+                ))
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self._commit(batch)
+            except Exception as error:
+                for future, *_ in batch:
+                    future.set_exception(error)
+                continue
+            finally:
+                connections[self.using].close_if_unusable_or_obsolete()
+            for (future, *_), (result, error) in zip(batch, results):
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+    def _commit(self, batch):
+        results = []
+        with transaction.atomic(using=self.using):
+            for _, func, args, kwargs in batch:
+                try:
+                    with transaction.atomic(using=self.using):
+                        results.append((func(*args, **kwargs), None))
+                except Exception as error:
+                    results.append((None, error))
+        return results
+
+
+_write_queue = WriteQueue()
+
+
+def serialized_write(func, *args, **kwargs):
+    """
+    Выполняет запись через общую очередь процесса, если включён
+    SQLITE_WRITE_QUEUE, иначе — сразу в текущем потоке.
+    """
+    if not settings.SQLITE_WRITE_QUEUE:
+        return func(*args, **kwargs)
+    db_router.mark_written()
+    return _write_queue.run(func, *args, **kwargs)
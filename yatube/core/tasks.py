@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger('yatube.tasks')
+
+_registry = {}
+_idle_hooks = []
+
+
+def task(func=None, *, priority=0, max_attempts=None):
+    """
+    Регистрирует функцию как фоновую задачу: func.delay(*args, **kwargs)
+    ставит её в очередь. Аргументы должны сериализоваться в JSON.
+    """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+        _registry[name] = func
+        func.task_name = name
+        func.delay = lambda *args, **kwargs: enqueue(
+            func, args, kwargs, priority=priority, max_attempts=max_attempts
+        )
+        return func
+    return decorator if func is None else decorator(func)
+
+
+def on_idle(func):
+    """
+    Вызывать func(), когда очередь опустела или обработчик остановлен:
+    например, закрыть соединение, которое задачи переиспользуют.
+    """
+    _idle_hooks.append(func)
+    return func
+
+
+def _idle():
+    for hook in _idle_hooks:
+        try:
+            hook()
+        except Exception:
+            logger.warning('Ошибка в %r', hook, exc_info=True)
+
+
+def enqueue(func, args=(), kwargs=None, priority=0, delay=0,
+            max_attempts=None):
+    """Ставит задачу в очередь; внутри транзакции — вместе с ней."""
+    return Task.objects.create(
+        name=getattr(func, 'task_name', func),
+        payload=json.dumps({'args': list(args), 'kwargs': kwargs or {}}),
+        priority=priority,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+    )
+
+
+def get_task(name):
+    if name not in _registry:
+        # Модуль с задачей регистрирует её при импорте.
+        import_string(name)
+    return _registry[name]
+
+
+def retry_delay(attempts):
+    """Экспоненциальная пауза со случайным разбросом ±50%."""
+    base = settings.TASK_RETRY_DELAY * 2 ** (attempts - 1)
+    return base * (0.5 + random.random())
+
+
+def _stale(now):
+    # RUNNING с давней блокировкой — обработчик упал посреди задачи.
+    stale = now - timedelta(seconds=settings.TASK_LOCK_TIMEOUT)
+    return Q(status=Task.RUNNING, locked_at__lt=stale)
+
+
+def _claimable(now):
+    return Q(status=Task.QUEUED, run_at__lte=now) | _stale(now)
+
+
+def _fail_stale(now):
+    """
+    Зависшая задача, у которой это была последняя попытка, — FAILED:
+    иначе задача, роняющая обработчик, забиралась бы бесконечно.
+    """
+    Task.objects.filter(
+        _stale(now), attempts__gte=F('max_attempts') - 1
+    ).update(
+        status=Task.FAILED,
+        attempts=F('attempts') + 1,
+        last_error=(
+            f'Обработчик не завершил задачу за '
+            f'{settings.TASK_LOCK_TIMEOUT} с'
+        ),
+        locked_by='',
+        locked_at=None,
+    )
+
+
+def claim(worker, batch_size):
+    """
+    Забирает до batch_size готовых задач одним UPDATE: строки, которые
+    успел перехватить другой обработчик, условие уже не пропустит.
+    Забранная у упавшего обработчика задача тратит попытку.
+    """
+    now = timezone.now()
+    _fail_stale(now)
+    ready = Task.objects.filter(_claimable(now))
+    ids = list(ready.values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    Task.objects.filter(_claimable(now), pk__in=ids).update(
+        status=Task.RUNNING,
+        attempts=Case(
+            When(status=Task.RUNNING, then=F('attempts') + 1),
+            default=F('attempts'),
+        ),
+        locked_by=worker,
+        locked_at=now,
+    )
+    return list(Task.objects.filter(
+        pk__in=ids, status=Task.RUNNING, locked_by=worker, locked_at=now,
+    ))
+
+
+def execute(task):
+    """Выполняет задачу; удачная удаляется, неудачная ждёт повтора."""
+    mine = Task.objects.filter(pk=task.pk, locked_by=task.locked_by)
+    try:
+        payload = json.loads(task.payload)
+        get_task(task.name)(*payload['args'], **payload['kwargs'])
+    except Exception:
+        attempts = task.attempts + 1
+        failed = attempts >= task.max_attempts
+        logger.warning(
+            'Задача %s #%s упала (попытка %s из %s)',
+            task.name, task.pk, attempts, task.max_attempts, exc_info=True,
+        )
+        mine.update(
+            status=Task.FAILED if failed else Task.QUEUED,
+            attempts=attempts,
+            run_at=timezone.now() + timedelta(seconds=retry_delay(attempts)),
+            last_error=traceback.format_exc(),
+            locked_by='',
+            locked_at=None,
+        )
+        return False
+    mine.delete()
+    return True
+
+
+class Worker:
+    """Обработчик очереди: забирает задачи пачками и выполняет по порядку."""
+
+    def __init__(self, name=None, batch_size=None, poll_interval=None):
+        self.name = name or (
+            f'{socket.gethostname()}:{os.getpid()}:'
+            f'{threading.current_thread().name}'
+        )
+        self.batch_size = batch_size or settings.TASK_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.TASK_POLL_INTERVAL
+
+    def run_once(self):
+        """Одна пачка; возвращает число взятых задач."""
+        tasks = claim(self.name, self.batch_size)
+        for task in tasks:
+            execute(task)
+        if len(tasks) < self.batch_size:
+            _idle()
+        return len(tasks)
+
+    def run(self, stop=None, drain=False):
+        """
+        Работает до stop.set(); с drain=True — пока очередь не опустеет.
+        Пустая очередь стоит один запрос раз в poll_interval.
+        """
+        stop = stop or threading.Event()
+        try:
+            while not stop.is_set():
+                if self.run_once():
+                    continue
+                if drain:
+                    return
+                stop.wait(self.poll_interval)
+        finally:
+            _idle()
+            connections.close_all()
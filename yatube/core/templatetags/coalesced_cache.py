@@ -0,0 +1,48 @@
+import hashlib
+
+from django import template
+
+from core.page_cache import get_or_compute
+
+register = template.Library()
+
+FRAGMENT_KEY_PREFIX = 'fragment:'
+
+
+class CoalescedCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = int(self.timeout.resolve(context))
+        vary = ':'.join(str(var.resolve(context)) for var in self.vary_on)
+        digest = hashlib.md5(vary.encode()).hexdigest()
+        return get_or_compute(
+            f'{FRAGMENT_KEY_PREFIX}{self.fragment_name}:{digest}',
+            lambda: self.nodelist.render(context),
+            timeout,
+        )
+
+
+@register.tag('coalesced_cache')
+def do_coalesced_cache(parser, token):
+    """
+    Как {% cache %}, но фрагмент пересобирает только один запрос:
+    {% coalesced_cache 60 "имя" переменная ... %}...{% endcoalesced_cache %}
+    """
+    nodelist = parser.parse(('endcoalesced_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' принимает как минимум два аргумента."
+        )
+    return CoalescedCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2].strip('"\''),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
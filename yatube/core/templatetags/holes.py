@@ -0,0 +1,14 @@
+from django import template
+
+from core.holes import marker
+
+register = template.Library()
+
+
+@register.simple_tag
+def hole(name, *args):
+    """
+    {% hole "имя" аргумент ... %} — место для фрагмента пользователя:
+    страница кешируется одна на всех, фрагмент подставляет HoleMiddleware.
+    """
+    return marker(name, *args)
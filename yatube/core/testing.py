@@ -0,0 +1,67 @@
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from posts import view_counts
+
+
+class isolated_shared_cache(override_settings):
+    """
+    Свой каталог общего кеша на прогон тестов: cache.clear() в тестах
+    не стирает кеш сайта на той же машине, а прогоны не делят страницы
+    и блокировки. Заменяет и memcached, если он задан.
+    """
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix='yatube_cache_')
+        super().__init__(CACHES={
+            **settings.CACHES,
+            'shared': {
+                'BACKEND': 'core.cache.AtomicFileBasedCache',
+                'LOCATION': self.directory,
+            },
+        })
+
+    def disable(self):
+        super().disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+@contextmanager
+def run_on_commit(using=DEFAULT_DB_ALIAS):
+    """
+    Выполняет обработчики transaction.on_commit, зарегистрированные
+    в блоке: транзакция TestCase не фиксируется, и сами они не сработают.
+    Как captureOnCommitCallbacks(execute=True) из Django 3.2.
+    """
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, callback in callbacks:
+        callback()
+
+
+class TestRunner(DiscoverRunner):
+    """manage.py test с отдельным общим кешем (см. isolated_shared_cache)."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.shared_cache = isolated_shared_cache()
+        self.shared_cache.enable()
+
+    def teardown_databases(self, old_config, **kwargs):
+        # Просмотры из тестов иначе запишет в настоящую базу сброс
+        # при выходе.
+        view_counts._take()
+        super().teardown_databases(old_config, **kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        self.shared_cache.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,6 +1,48 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
-from django.test import Client, TestCase
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.http import Http404, HttpResponse
+from django.template import Context, Template
+from django.db import DatabaseError, connection
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from core import db_router
+from core.db_router import PrimaryReplicaRouter
+from core.cache import AtomicFileBasedCache, TwoTierCache
+from core.metrics import Registry
+from core import page_cache, tasks
+from core.page_cache import cache_page_coalesced, get_or_compute, lookup
+from core.middleware.replica_pinning import (PIN_COOKIE,
+                                             ReplicaPinningMiddleware)
+from core.slow_queries import fingerprint, read, write
+from core.sqlite import WriteQueue
+from core.testing import run_on_commit
+from core.models import Task
+from posts.models import Group, Post
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -11,3 +53,928 @@ class ViewTestClass(TestCase):
         response = self.client.get('/unexisting/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_header_for_staff_only(self):
+        """Без семплирования Server-Timing получают только сотрудники."""
+        client = Client()
+        client.force_login(self.user)
+        self.assertNotIn('Server-Timing', client.get('/'))
+        client.force_login(self.staff)
+        header = client.get('/')['Server-Timing']
+        for metric in ('db;', 'tpl;', 'thumb;', 'cache;', 'total;'):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, header)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_sampled_users_get_header(self):
+        response = Client().get('/')
+        self.assertIn('Server-Timing', response)
+
+    def test_structured_log(self):
+        """Итог запроса пишется в лог в виде JSON."""
+        with self.assertLogs('yatube.performance', 'INFO') as logs:
+            Client().get('/')
+            Client().get('/')
+        first, second = (json.loads(r.getMessage()) for r in logs.records)
+        self.assertEqual(first['url_name'], 'posts:index')
+        self.assertGreater(first['queries'], 0)
+        self.assertEqual(second['queries'], 0)
+        self.assertGreater(second['cache_hits'], 0)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.registry = Registry()
+        self.requests = self.registry.counter('requests_total', 'Запросы.')
+        self.duration = self.registry.histogram(
+            'duration_seconds', 'Время.', buckets=(0.1, 1)
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_text_exposition(self):
+        self.requests.inc(url_name='posts:index', status=200)
+        self.requests.inc(url_name='posts:index', status=200)
+        self.duration.observe(0.05, url_name='posts:index')
+        self.duration.observe(0.5, url_name='posts:index')
+        text = self.registry.expose()
+        self.assertIn('# TYPE requests_total counter', text)
+        self.assertIn(
+            'requests_total{status="200",url_name="posts:index"} 2', text
+        )
+        self.assertIn(
+            'duration_seconds_bucket{url_name="posts:index",le="0.1"} 1', text
+        )
+        self.assertIn(
+            'duration_seconds_bucket{url_name="posts:index",le="+Inf"} 2',
+            text
+        )
+        self.assertIn('duration_seconds_count{url_name="posts:index"} 2', text)
+
+    def test_workers_aggregate_through_directory(self):
+        """Снимки других воркеров суммируются с текущим процессом."""
+        with tempfile.TemporaryDirectory() as directory:
+            other = {'requests_total': {
+                '[["status", 200]]': 3,
+            }}
+            with open(os.path.join(directory, '1.json'), 'w') as snapshot:
+                json.dump(other, snapshot)
+            self.requests.inc(status=200)
+            text = self.registry.expose(directory)
+        self.assertIn('requests_total{status="200"} 4', text)
+
+    def write_snapshot(self, directory, name, total):
+        with open(os.path.join(directory, name), 'w') as snapshot:
+            json.dump({'requests_total': {'[]': total}}, snapshot)
+
+    def test_dead_process_snapshots_are_folded(self):
+        """Снимок умершего воркера не теряется, но и не копится файлом."""
+        process = subprocess.Popen(['true'])
+        process.wait()
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_snapshot(directory, f'{process.pid}-old.json', 3)
+            self.requests.inc()
+            self.assertIn('requests_total 4', self.registry.expose(directory))
+            self.assertEqual(
+                sorted(os.listdir(directory)),
+                sorted(['.lock', 'dead.json', self.registry.snapshot_name()])
+            )
+            self.requests.inc()
+            self.assertIn('requests_total 5', self.registry.expose(directory))
+
+    def test_recycled_pid_keeps_previous_totals(self):
+        """Новый процесс с тем же pid не затирает итоги прежнего."""
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_snapshot(directory, f'{os.getpid()}-previous.json', 7)
+            old = time.time() - 60
+            os.utime(
+                os.path.join(directory, f'{os.getpid()}-previous.json'),
+                (old, old)
+            )
+            self.requests.inc()
+            self.assertIn('requests_total 8', self.registry.expose(directory))
+            self.assertNotIn(
+                f'{os.getpid()}-previous.json', os.listdir(directory)
+            )
+
+    def test_threads_do_not_lose_updates(self):
+        def work():
+            for _ in range(1000):
+                self.requests.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn('requests_total 4000', self.registry.expose())
+
+    def test_metrics_endpoint(self):
+        Client().get('/')
+        response = Client().get('/metrics')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        text = response.content.decode()
+        self.assertIn('yatube_requests_total{status="200",'
+                      'url_name="posts:index"}', text)
+        self.assertIn('yatube_page_cache_requests_total{result="miss",'
+                      'url_name="posts:index"}', text)
+
+    @override_settings(INTERNAL_IPS=[])
+    def test_metrics_endpoint_is_internal(self):
+        response = Client().get('/metrics')
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'slow.log')
+
+    def tearDown(self):
+        cache.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_fingerprint_ignores_literals(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) AND a = 1'),
+            fingerprint("SELECT *  FROM t WHERE id IN (%s) AND a = 'x'"),
+        )
+
+    def test_slow_queries_are_attributed_to_view(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=0,
+                               SLOW_QUERY_LOG=self.path):
+            Client().get('/')
+        records = list(read(self.path))
+        self.assertTrue(records)
+        record = records[0]
+        self.assertEqual(record['url_name'], 'posts:index')
+        self.assertTrue(record['explain'])
+        self.assertNotIn('EXPLAIN', ' '.join(r['sql'] for r in records))
+
+    def test_report_command_groups_by_fingerprint(self):
+        for duration in (10, 30):
+            write({
+                'fingerprint': 'abc',
+                'sql': 'SELECT ?',
+                'duration_ms': duration,
+                'url_name': 'posts:index',
+            }, self.path)
+        out = StringIO()
+        call_command('slowqueries', path=self.path, stdout=out)
+        self.assertIn('abc  count=2  total=40.0ms  avg=20.0ms', out.getvalue())
+        self.assertIn('views=posts:index', out.getvalue())
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.client = Client()
+
+    def tearDown(self):
+        cache.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def profiles(self, url_name):
+        directory = os.path.join(self.directory, url_name)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            os.path.splitext(name)[1] for name in os.listdir(directory)
+        )
+
+    def test_header_profiles_staff_requests(self):
+        self.client.force_login(self.staff)
+        with override_settings(PROFILING_DIR=self.directory):
+            response = self.client.get('/', HTTP_X_PROFILE='cprofile')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(self.profiles('posts.index'),
+                         ['.collapsed', '.prof'])
+
+    def test_header_ignored_for_regular_users(self):
+        self.client.force_login(self.user)
+        with override_settings(PROFILING_DIR=self.directory):
+            self.client.get('/', HTTP_X_PROFILE='cprofile')
+        self.assertEqual(self.profiles('posts.index'), [])
+
+    def test_sampled_staff_requests_use_stack_sampler(self):
+        self.client.force_login(self.staff)
+        with override_settings(PROFILING_DIR=self.directory,
+                               PROFILING_SAMPLE_RATE=1):
+            self.client.get('/about/author/')
+        self.assertEqual(self.profiles('about.author'), ['.collapsed'])
+
+    def test_sampling_skips_other_users(self):
+        with override_settings(PROFILING_DIR=self.directory,
+                               PROFILING_SAMPLE_RATE=1):
+            self.client.get('/about/author/')
+            self.client.force_login(self.user)
+            self.client.get('/about/tech/')
+        self.assertEqual(self.profiles('about.author'), [])
+        self.assertEqual(self.profiles('about.tech'), [])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        db_router.reset()
+
+    def tearDown(self):
+        db_router.reset()
+
+    def test_reads_go_to_replicas_and_writes_to_primary(self):
+        self.assertIn(self.router.db_for_read(User), ['replica1', 'replica2'])
+        self.assertEqual(self.router.db_for_write(User), 'default')
+
+    def test_reads_are_pinned_after_write(self):
+        self.router.db_for_write(User)
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertTrue(db_router.has_written())
+
+    def test_only_primary_is_migrated(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+    def test_cookie_pins_reads_to_primary(self):
+        reads = []
+
+        def view_read(request):
+            reads.append(self.router.db_for_read(User))
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view_read)
+        middleware(RequestFactory().get('/'))
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        middleware(request)
+        self.assertIn(reads[0], ['replica1', 'replica2'])
+        self.assertEqual(reads[1], 'default')
+
+
+class ReplicaPinningTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_write_sets_pin_cookie(self):
+        response = self.client.post('/create/', {'text': 'Новый пост'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(
+            response.cookies[PIN_COOKIE]['max-age'],
+            settings.REPLICA_PIN_SECONDS
+        )
+
+    def test_read_does_not_set_pin_cookie(self):
+        response = self.client.get('/about/tech/')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class SQLiteTests(TransactionTestCase):
+    def test_pragmas_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0],
+                settings.SQLITE_PRAGMAS['busy_timeout']
+            )
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_write_queue_isolates_failed_jobs(self):
+        write_queue = WriteQueue(batch_size=5)
+
+        def create(slug):
+            if slug == 'broken':
+                raise ValueError(slug)
+            return Group.objects.create(title=slug, slug=slug).pk
+
+        futures = [
+            write_queue.submit(create, slug)
+            for slug in ('first', 'broken', 'second')
+        ]
+        self.assertTrue(futures[0].result(timeout=5))
+        with self.assertRaises(ValueError):
+            futures[1].result(timeout=5)
+        self.assertTrue(futures[2].result(timeout=5))
+        self.assertEqual(
+            set(Group.objects.values_list('slug', flat=True)),
+            {'first', 'second'}
+        )
+
+    @override_settings(SQLITE_WRITE_QUEUE=True)
+    def test_views_write_through_queue(self):
+        user = User.objects.create_user(username='user')
+        client = Client()
+        client.force_login(user)
+        response = client.post('/create/', {'text': 'Через очередь'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertTrue(Post.objects.filter(text='Через очередь').exists())
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-tests',
+    },
+})
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+
+    def make_cache(self, **options):
+        """Отдельный экземпляр — как кеш другого воркера."""
+        return TwoTierCache(
+            uuid.uuid4().hex, {'OPTIONS': {'SHARED': 'shared', **options}}
+        )
+
+    def test_local_tier_serves_repeated_reads(self):
+        cache = self.make_cache(CHECK_INTERVAL=60)
+        cache.set('key', 'value')
+        caches['shared'].clear()
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.stats()['local_hits'], 1)
+
+    def test_invalidation_reaches_other_workers(self):
+        first = self.make_cache(CHECK_INTERVAL=0)
+        second = self.make_cache(CHECK_INTERVAL=0)
+        first.set('key', 1)
+        self.assertEqual(second.get('key'), 1)
+        first.set('key', 2)
+        self.assertEqual(second.get('key'), 2)
+        first.delete('key')
+        self.assertIsNone(second.get('key'))
+        stats = second.stats()
+        self.assertEqual(stats['stale'], 2)
+        self.assertEqual(stats['shared_hits'], 2)
+
+    def test_local_tier_is_bounded(self):
+        cache = self.make_cache(MAX_ENTRIES=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertEqual(cache.stats()['local_entries'], 2)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.get('a'), 'a')
+        self.assertEqual(cache.stats()['shared_hits'], 1)
+
+    def test_add_and_clear(self):
+        cache = self.make_cache()
+        self.assertTrue(cache.add('key', 'value'))
+        self.assertFalse(cache.add('key', 'other'))
+        cache.clear()
+        self.assertIsNone(cache.get('key'))
+
+    def test_file_add_is_atomic_across_instances(self):
+        """Экземпляры на одном каталоге — как воркеры на одной машине."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        barrier = threading.Barrier(8)
+        won = []
+
+        def add():
+            backend = AtomicFileBasedCache(directory, {})
+            barrier.wait()
+            for attempt in range(20):
+                if backend.add(f'lock:{attempt}', 1):
+                    won.append(attempt)
+
+        threads = [threading.Thread(target=add) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(won), list(range(20)))
+
+    @override_settings(CACHES={
+        **settings.CACHES,
+        'plain': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.gettempdir(),
+        },
+    })
+    def test_non_atomic_shared_tier_is_rejected(self):
+        cache = TwoTierCache(
+            uuid.uuid4().hex, {'OPTIONS': {'SHARED': 'plain'}}
+        )
+        with self.assertRaises(ImproperlyConfigured):
+            cache.get('key')
+
+
+class StampedeProtectionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'page'
+
+        def request():
+            results.append(get_or_compute('stampede', compute, 20))
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['page'] * 5)
+
+    def test_stale_copy_served_while_rebuilding(self):
+        cache.set('stale', {'value': 'old', 'expires': 0, 'delta': 0}, 60)
+        cache.add('stale:lock', 1)
+        self.assertEqual(get_or_compute('stale', lambda: 'new', 20), 'old')
+        cache.delete('stale:lock')
+        self.assertEqual(get_or_compute('stale', lambda: 'new', 20), 'new')
+
+    def test_expensive_entries_refresh_early(self):
+        cache.set('early', {
+            'value': 'old', 'expires': time.time() + 1, 'delta': 1000,
+        }, 60)
+        self.assertEqual(get_or_compute('early', lambda: 'new', 20), 'new')
+        self.assertEqual(
+            get_or_compute('early', lambda: 'newer', 20, beta=0), 'new'
+        )
+
+    def test_fragment_tag(self):
+        source = Template(
+            '{% load coalesced_cache %}'
+            '{% coalesced_cache 60 "fragment" key %}{{ value }}'
+            '{% endcoalesced_cache %}'
+        )
+        first = source.render(Context({'key': 1, 'value': 'first'}))
+        second = source.render(Context({'key': 1, 'value': 'second'}))
+        other = source.render(Context({'key': 2, 'value': 'other'}))
+        self.assertEqual((first, second, other), ('first', 'first', 'other'))
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@mock.patch.object(page_cache, 'RECOVERY_DELAY', 0.01)
+class DegradedModeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        cache.set('feed', {'value': 'old', 'expires': 0, 'delta': 0}, 60)
+
+    def tearDown(self):
+        wait_until(lambda: cache.get('feed:lock') is None)
+        cache.clear()
+
+    def test_stale_copy_served_on_error_and_recovered(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            if len(calls) < 2:
+                raise DatabaseError('database is down')
+            return 'new'
+
+        for _ in range(2):
+            self.assertEqual(
+                lookup('feed', compute, 20, serve_stale_on_error=True),
+                ('old', page_cache.STALE),
+            )
+        # Во время паузы база не опрашивается.
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(wait_until(
+            lambda: lookup('feed', compute, 20, serve_stale_on_error=True)
+            == ('new', page_cache.MISS)
+        ))
+        self.assertEqual(len(calls), 2)
+        self.assertIsNone(cache.get('feed:failures'))
+
+    def test_refresh_runs_in_request_thread(self):
+        threads = []
+
+        def compute():
+            threads.append(threading.current_thread())
+            return 'new'
+
+        lookup('feed', compute, 20, serve_stale_on_error=True)
+        self.assertEqual(threads, [threading.current_thread()])
+
+    def test_errors_raise_without_degraded_mode(self):
+        def compute():
+            raise DatabaseError('database is down')
+
+        with self.assertRaises(DatabaseError):
+            lookup('feed', compute, 20)
+
+    def test_client_errors_are_not_masked(self):
+        def compute():
+            raise Http404
+
+        with self.assertRaises(Http404):
+            lookup('feed', compute, 20, serve_stale_on_error=True)
+
+    def test_view_marks_stale_response(self):
+        responses = [
+            HttpResponse('fresh'), DatabaseError('down'),
+            HttpResponse('recovered'),
+        ]
+
+        @cache_page_coalesced(0, stale_timeout=60, serve_stale_on_error=True)
+        def view(request):
+            result = responses.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        request = RequestFactory().get('/feed/')
+        first = view(request)
+        second = view(request)
+        self.assertEqual(first[page_cache.CACHE_HEADER], page_cache.MISS)
+        self.assertEqual(second[page_cache.CACHE_HEADER], page_cache.STALE)
+        self.assertEqual(second.content, b'fresh')
+        self.assertTrue(wait_until(
+            lambda: view(request).content == b'recovered'
+        ))
+
+    def test_view_sets_browser_cache_headers(self):
+        @cache_page_coalesced(30)
+        def view(request):
+            return HttpResponse('page')
+
+        request = RequestFactory().get('/page/')
+        for response in (view(request), view(request)):
+            self.assertIn('max-age=30', response['Cache-Control'])
+            self.assertTrue(response.has_header('Expires'))
+
+
+class QuerysetCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(title='Первая', slug='first')
+        cls.other = Group.objects.create(title='Вторая', slug='second')
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_repeated_queryset_served_from_cache(self):
+        with self.assertNumQueries(1):
+            Group.objects.cache().get(slug='first')
+            group = Group.objects.cache().get(slug='first')
+        self.assertEqual(group, self.group)
+
+    def test_uncached_by_default(self):
+        with self.assertNumQueries(2):
+            Group.objects.get(slug='first')
+            Group.objects.get(slug='first')
+
+    def test_save_invalidates_table(self):
+        Group.objects.cache().get(slug='first')
+        self.other.title = 'Изменена'
+        with run_on_commit():
+            self.other.save()
+        with self.assertNumQueries(1):
+            Group.objects.cache().get(slug='first')
+
+    def test_stamps_bumped_after_commit(self):
+        Group.objects.cache().get(slug='first')
+        with run_on_commit():
+            self.other.save()
+            Group.objects.update(description='Все')
+            # До фиксации другие соединения видят старые строки.
+            with self.assertNumQueries(0):
+                Group.objects.cache().get(slug='first')
+        with self.assertNumQueries(1):
+            Group.objects.cache().get(slug='first')
+
+    def test_pk_lookup_invalidated_by_own_row_only(self):
+        Group.objects.cache().get(pk=self.group.pk)
+        with run_on_commit():
+            self.other.save()
+        with self.assertNumQueries(0):
+            Group.objects.cache().get(pk=self.group.pk)
+        self.group.title = 'Новое название'
+        with run_on_commit():
+            self.group.save()
+        with self.assertNumQueries(1):
+            group = Group.objects.cache().get(pk=self.group.pk)
+        self.assertEqual(group.title, 'Новое название')
+
+    def test_update_and_bulk_create_invalidate(self):
+        queryset = Group.objects.cache().order_by('slug')
+        self.assertEqual(len(queryset.all()), 2)
+        with run_on_commit():
+            Group.objects.filter(slug='second').update(title='Обновлена')
+        self.assertEqual(queryset.all()[1].title, 'Обновлена')
+        with run_on_commit():
+            Group.objects.bulk_create([Group(title='Третья', slug='third')])
+        self.assertEqual(queryset.count(), 3)
+        Group.objects.cache().get(pk=self.group.pk)
+        with run_on_commit():
+            Group.objects.update(description='Все')
+        self.assertEqual(
+            Group.objects.cache().get(pk=self.group.pk).description, 'Все'
+        )
+
+    def test_per_queryset_timeout(self):
+        with self.assertNumQueries(2):
+            Group.objects.cache(timeout=0).get(slug='first')
+            Group.objects.cache(timeout=0).get(slug='first')
+
+
+done = []
+
+
+@tasks.task
+def record(value):
+    done.append(value)
+
+
+@tasks.task(max_attempts=2)
+def explode():
+    raise ValueError('задача упала')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        done.clear()
+
+    def test_delay_and_run(self):
+        record.delay('first')
+        self.assertEqual(tasks.Worker('test').run_once(), 1)
+        self.assertEqual(done, ['first'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_priority_order(self):
+        tasks.enqueue(record, ['low'])
+        tasks.enqueue(record, ['high'], priority=10)
+        tasks.Worker('test', batch_size=10).run_once()
+        self.assertEqual(done, ['high', 'low'])
+
+    def test_delayed_task_waits(self):
+        tasks.enqueue(record, ['later'], delay=60)
+        self.assertEqual(tasks.Worker('test').run_once(), 0)
+
+    def test_batches_are_disjoint(self):
+        for value in range(3):
+            record.delay(value)
+        first = tasks.claim('first', 2)
+        second = tasks.claim('second', 2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse(
+            {task.pk for task in first} & {task.pk for task in second}
+        )
+
+    def test_retry_with_backoff_then_fail(self):
+        explode.delay()
+        with self.assertLogs('yatube.tasks', 'WARNING'):
+            tasks.Worker('test').run_once()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.QUEUED, 1))
+        self.assertGreater(task.run_at, timezone.now())
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('yatube.tasks', 'WARNING'):
+            tasks.Worker('test').run_once()
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+        self.assertIn('задача упала', task.last_error)
+
+    def test_stale_running_task_reclaimed(self):
+        record.delay('again')
+        tasks.claim('crashed', 1)
+        self.assertEqual(tasks.claim('other', 1), [])
+        Task.objects.update(
+            locked_at=timezone.now() - timedelta(
+                seconds=settings.TASK_LOCK_TIMEOUT + 1
+            )
+        )
+        [task] = tasks.claim('other', 1)
+        self.assertEqual(task.attempts, 1)
+
+    def test_task_crashing_workers_fails(self):
+        tasks.enqueue(record, ['crash'], max_attempts=2)
+        stale = timezone.now() - timedelta(
+            seconds=settings.TASK_LOCK_TIMEOUT + 1
+        )
+        for _ in range(2):
+            self.assertEqual(len(tasks.claim('crashed', 1)), 1)
+            Task.objects.update(locked_at=stale)
+        self.assertEqual(tasks.claim('other', 1), [])
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+        self.assertEqual(task.locked_by, '')
+
+    def test_runworker_once(self):
+        record.delay('command')
+        call_command('runworker', '--once', stdout=StringIO())
+        self.assertEqual(done, ['command'])
+
+
+class CountingBackend(EmailBackend):
+    """locmem-бэкенд, который считает соединения и умеет падать."""
+    opened = 0
+    failures = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        if CountingBackend.failures:
+            CountingBackend.failures -= 1
+            raise ConnectionError('SMTP недоступен')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+    QUEUED_EMAIL_BACKEND='core.tests.CountingBackend',
+)
+class QueuedEmailTests(TestCase):
+    def setUp(self):
+        CountingBackend.opened = 0
+        CountingBackend.failures = 0
+
+    def test_send_returns_before_delivery(self):
+        mail.send_mail('Тема', 'Текст', 'from@yatube.ru', ['to@yatube.ru'])
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_batch_shares_one_connection(self):
+        for number in range(3):
+            mail.send_mail(
+                f'Письмо {number}', 'Текст', 'from@yatube.ru', ['to@yatube.ru']
+            )
+        tasks.Worker('test', batch_size=10).run_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(CountingBackend.opened, 1)
+
+    def test_failed_delivery_retried(self):
+        CountingBackend.failures = 1
+        mail.send_mail('Тема', 'Текст', 'from@yatube.ru', ['to@yatube.ru'])
+        with self.assertLogs('yatube.tasks', 'WARNING'):
+            tasks.Worker('test').run_once()
+        self.assertEqual(mail.outbox, [])
+        Task.objects.update(run_at=timezone.now())
+        tasks.Worker('test').run_once()
+        self.assertEqual(mail.outbox[0].subject, 'Тема')
+
+    def test_payload_is_plain_json(self):
+        message = mail.EmailMultiAlternatives(
+            'Тема', 'Текст', 'from@yatube.ru', ['to@yatube.ru'],
+            bcc=['hidden@yatube.ru'],
+        )
+        message.attach_alternative('<p>Текст</p>', 'text/html')
+        message.attach('data.bin', b'\x00\xff', 'application/octet-stream')
+        message.send()
+        payload = json.loads(Task.objects.get().payload)
+        self.assertEqual(payload['args'][0]['subject'], 'Тема')
+        tasks.Worker('test').run_once()
+        sent = mail.outbox[0]
+        self.assertEqual(
+            sent.recipients(), ['to@yatube.ru', 'hidden@yatube.ru']
+        )
+        self.assertEqual(sent.alternatives, [('<p>Текст</p>', 'text/html')])
+        self.assertEqual(
+            sent.attachments,
+            [('data.bin', b'\x00\xff', 'application/octet-stream')],
+        )
+
+    def test_fail_silently_when_queue_unavailable(self):
+        error = DatabaseError('очередь недоступна')
+        with mock.patch.object(Task.objects, 'create', side_effect=error):
+            with self.assertLogs('yatube.tasks', 'WARNING'):
+                sent = mail.send_mail(
+                    'Тема', 'Текст', 'from@yatube.ru', ['to@yatube.ru'],
+                    fail_silently=True,
+                )
+            self.assertEqual(sent, 0)
+            with self.assertRaises(DatabaseError):
+                mail.send_mail(
+                    'Тема', 'Текст', 'from@yatube.ru', ['to@yatube.ru']
+                )
+
+    def test_password_reset_is_queued(self):
+        User.objects.create_user(
+            username='forgot', email='forgot@yatube.ru', password='secret'
+        )
+        response = self.client.post(
+            reverse('users:password_reset_form'),
+            {'email': 'forgot@yatube.ru'},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(mail.outbox, [])
+        call_command('runworker', '--once', stdout=StringIO())
+        self.assertEqual(mail.outbox[0].to, ['forgot@yatube.ru'])
+
+
+class SessionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='session', password='secret'
+        )
+        self.client.login(username='session', password='secret')
+
+    def test_authenticated_request_skips_session_and_user_queries(self):
+        url = reverse('about:author')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_profile_change_refreshes_cached_user(self):
+        url = reverse('about:author')
+        self.client.get(url)
+        self.user.first_name = 'Новое'
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.wsgi_request.user.first_name, 'Новое')
+
+    def test_failed_login_checks_password_once(self):
+        with mock.patch.object(
+            User, 'check_password', autospec=True, return_value=False
+        ) as check_password:
+            self.assertIsNone(
+                authenticate(username='session', password='wrong')
+            )
+        check_password.assert_called_once()
+
+    def test_uncached_user_read_from_database(self):
+        cache.clear()
+        response = self.client.get(reverse('about:author'))
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_password_change_ends_session(self):
+        url = reverse('about:author')
+        self.client.get(url)
+        self.user.set_password('changed')
+        self.user.save()
+        response = self.client.get(url)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_purge_removes_only_expired_sessions(self):
+        past = timezone.now() - timedelta(days=1)
+        for _ in range(5):
+            store = SessionStore()
+            store.create()
+            Session.objects.filter(session_key=store.session_key).update(
+                expire_date=past
+            )
+        alive = Session.objects.filter(expire_date__gt=timezone.now())
+        alive_keys = set(alive.values_list('session_key', flat=True))
+        out = StringIO()
+        call_command('purgesessions', '--batch-size', '2', '--pause', '0',
+                     stdout=out)
+        self.assertIn('5', out.getvalue())
+        self.assertEqual(
+            set(Session.objects.values_list('session_key', flat=True)),
+            alive_keys,
+        )
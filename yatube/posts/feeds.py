@@ -0,0 +1,489 @@
+"""
+Ленты как списки id постов (общая, группы, автора) плюс кеш объектов
+Post/User/Group. В кеше лежат только первые FEED_SIZE id ленты, дальние
+страницы читаются из базы. Новый пост дописывается в начало списков,
+изменение поста сбрасывает только его запись в кеше объектов.
+"""
+import abc
+import heapq
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Q
+
+from core.queryset_cache import bulk_version
+
+from .models import Follow, Group, GroupFollow, Post
+
+User = get_user_model()
+
+LOCK_TIMEOUT = 5
+LOCK_WAIT = 1
+POLL_INTERVAL = 0.01
+# Обратный индекс источника с подписчиками сверх FEED_FOLLOWERS_LIMIT:
+# подписчиков ищем в базе.
+CROWDED = 'crowded'
+
+
+def index_feed():
+    return 'index'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def author_feed(author_id):
+    return f'author:{author_id}'
+
+
+def _feed_key(feed):
+    # update() и bulk_create() идут мимо сигналов — тогда списки
+    # пересобираются целиком.
+    return f'feed:{bulk_version(Post._meta.db_table)}:{feed}'
+
+
+def _version_key(feed):
+    return f'feed_version:{feed}'
+
+
+def _feed_queryset(feed):
+    kind, _, pk = feed.partition(':')
+    posts = Post.objects.order_by('-pub_date', '-id')
+    if kind == 'group':
+        posts = posts.filter(group_id=pk)
+    elif kind == 'author':
+        posts = posts.filter(author_id=pk)
+    return posts
+
+
+class CachedHead(abc.ABC):
+    """
+    Лента для Paginator: первые страницы — из закешированного начала
+    списка id, дальние срезы читает read() из базы.
+    """
+
+    def __init__(self, entry):
+        self.ids = entry['ids']
+        self.total = entry['count']
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        stop = index.stop if isinstance(index, slice) else index + 1
+        if stop <= len(self.ids) or len(self.ids) == self.total:
+            return self.ids[index]
+        return self.read(index, stop)
+
+    @abc.abstractmethod
+    def read(self, index, stop):
+        """Срез index ленты из базы; stop — его конец."""
+
+
+class Feed(CachedHead):
+    """Общая лента, лента группы или автора."""
+
+    def __init__(self, feed, entry):
+        super().__init__(entry)
+        self.feed = feed
+
+    def read(self, index, stop):
+        ids = _feed_queryset(self.feed).values_list('id', flat=True)[index]
+        return list(ids) if isinstance(index, slice) else ids
+
+
+def _head(queryset, size):
+    """Первые size id и размер выборки; count() — только если не влезли."""
+    ids = list(queryset.values_list('id', flat=True)[:size + 1])
+    if len(ids) <= size:
+        return {'ids': ids, 'count': len(ids)}
+    return {'ids': ids[:size], 'count': queryset.count()}
+
+
+def post_ids(feed):
+    """id постов ленты, от новых к старым."""
+    key = _feed_key(feed)
+    entry = cache.get(key)
+    if entry is None:
+        version = cache.get(_version_key(feed))
+        entry = _head(_feed_queryset(feed), settings.FEED_SIZE)
+        # Пока шёл запрос, пост мог добавиться мимо отсутствующего
+        # списка: тогда не сохраняем, соберём при следующем запросе.
+        if cache.get(_version_key(feed)) == version:
+            cache.add(key, entry, settings.FEED_IDS_TIMEOUT)
+    return Feed(feed, entry)
+
+
+def _update_locked(key, change, timeout):
+    """
+    Чтение-изменение-запись под короткой блокировкой; change(None)
+    для отсутствующего ключа, None в ответ — удалить ключ.
+    Возвращает False, если блокировку взять не удалось.
+    """
+    lock_key = f'{key}:lock'
+    deadline = time.time() + LOCK_WAIT
+    while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if time.time() > deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+    try:
+        value = change(cache.get(key))
+        if value is None:
+            cache.delete(key)
+        else:
+            cache.set(key, value, timeout)
+    finally:
+        cache.delete(lock_key)
+    return True
+
+
+def _change_feed(feed, change):
+    cache.set(_version_key(feed), uuid.uuid4().hex, None)
+    key = _feed_key(feed)
+    updated = _update_locked(
+        key, lambda entry: None if entry is None else change(entry),
+        settings.FEED_IDS_TIMEOUT,
+    )
+    if not updated:
+        cache.delete(key)
+
+
+def drop_feed(feed):
+    cache.set(_version_key(feed), uuid.uuid4().hex, None)
+    cache.delete(_feed_key(feed))
+
+
+def post_sources(post, group_id):
+    """Ленты автора и группы поста — источники лент подписок."""
+    sources = [author_feed(post.author_id)]
+    if group_id is not None:
+        sources.append(group_feed(group_id))
+    return sources
+
+
+def _feeds(post, group_id):
+    return [index_feed(), *post_sources(post, group_id)]
+
+
+def _prepend(pk):
+    def change(entry):
+        return {
+            'ids': [pk, *entry['ids']][:settings.FEED_SIZE],
+            'count': entry['count'] + 1,
+        }
+    return change
+
+
+def _without(pk):
+    def change(entry):
+        ids = [other for other in entry['ids'] if other != pk]
+        if len(ids) == len(entry['ids']) == entry['count']:
+            # Лента в кеше целиком, а поста в ней нет.
+            return entry
+        return {'ids': ids, 'count': entry['count'] - 1}
+    return change
+
+
+def add_post(post):
+    for feed in _feeds(post, post.group_id):
+        _change_feed(feed, _prepend(post.pk))
+
+
+def remove_post(post):
+    for feed in _feeds(post, post.group_id):
+        _change_feed(feed, _without(post.pk))
+
+
+def move_post(post, old_group_id):
+    """Пост сменил группу: убрать из старой, новую собрать заново."""
+    if old_group_id is not None:
+        _change_feed(group_feed(old_group_id), _without(post.pk))
+    if post.group_id is not None:
+        drop_feed(group_feed(post.group_id))
+
+
+class FollowFeed(CachedHead):
+    """
+    Лента подписок: дальние срезы — слиянием диапазонов источников
+    после курсора (pub_date, id). Курсор — конец закешированного начала
+    или конец прочитанной ранее страницы, так что страница за страницей
+    стоит k × размер страницы строк, а не всё от начала ленты.
+    """
+
+    def __init__(self, entry):
+        super().__init__(entry)
+        self.sources = entry['sources']
+        self.cursor = entry.get('cursor')
+        self.token = entry.get('token')
+
+    def _cursor_key(self, position):
+        return f'follow_cursor:{self.token}:{position}'
+
+    def read(self, index, stop):
+        is_slice = isinstance(index, slice)
+        start = (index.start or 0) if is_slice else index
+        offset, cursor = len(self.ids), self.cursor
+        if cursor is None:
+            offset = 0
+        elif start > offset:
+            found = cache.get(self._cursor_key(start))
+            if found is not None:
+                offset, cursor = start, found
+        pairs = _merge(self.sources, stop - offset, before=cursor)
+        if pairs and len(pairs) == stop - offset:
+            cache.set(
+                self._cursor_key(stop), pairs[-1], settings.FEED_IDS_TIMEOUT
+            )
+        ids = [pk for _, pk in pairs]
+        if not is_slice:
+            return ids[index - offset]
+        return self.ids[start:offset] + ids[max(start - offset, 0):]
+
+
+def _follow_name(user_id):
+    return f'follow:{user_id}'
+
+
+def _follow_key(user_id):
+    versions = ':'.join(
+        bulk_version(model._meta.db_table) for model in (Follow, GroupFollow)
+    )
+    return _feed_key(f'{_follow_name(user_id)}:{versions}')
+
+
+def _followers_key(source):
+    """
+    Обратный индекс: чьи ленты подписок читают ленту source —
+    множество id до FEED_FOLLOWERS_LIMIT штук, дальше CROWDED.
+    """
+    return f'feed_followers:{source}'
+
+
+def _register(user_id, sources):
+    """
+    Записывает user_id в обратные индексы sources; под блокировкой —
+    только те, где его ещё нет. False — блокировку взять не удалось.
+    """
+    keys = [_followers_key(source) for source in sources]
+    found = cache.get_many(keys)
+
+    def add(users):
+        users = users or set()
+        if users == CROWDED or len(users) >= settings.FEED_FOLLOWERS_LIMIT:
+            return CROWDED
+        return users | {user_id}
+
+    for key in keys:
+        users = found.get(key)
+        if users == CROWDED or users is not None and user_id in users:
+            continue
+        if not _update_locked(key, add, settings.FEED_IDS_TIMEOUT * 2):
+            return False
+    return True
+
+
+def drop_follow_feed(user_id):
+    cache.set(_version_key(_follow_name(user_id)), uuid.uuid4().hex, None)
+    cache.delete(_follow_key(user_id))
+
+
+def _source_subscribers(source):
+    kind, _, pk = source.partition(':')
+    if kind == 'group':
+        rows = GroupFollow.objects.filter(group_id=pk)
+    else:
+        rows = Follow.objects.filter(author_id=pk)
+    return rows.values_list('user_id', flat=True)
+
+
+def drop_subscriber_feeds(*sources):
+    """В ленте автора или группы новый пост: сбросить ленты подписчиков."""
+    users = set()
+    from_database = []
+    found = cache.get_many([_followers_key(source) for source in sources])
+
+    def take(source):
+        def change(subscribers):
+            if subscribers == CROWDED:
+                from_database.append(source)
+                return CROWDED
+            users.update(subscribers or ())
+        return change
+
+    for source in sources:
+        key = _followers_key(source)
+        if found.get(key) is None:
+            # Никто не записался — значит, и лент, собранных до поста, нет.
+            continue
+        if found[key] == CROWDED or not _update_locked(
+            key, take(source), settings.FEED_IDS_TIMEOUT * 2
+        ):
+            # Подписчиков слишком много или индекс занят — берём из базы.
+            from_database.append(source)
+    for source in set(from_database):
+        users.update(_source_subscribers(source))
+    for user_id in users:
+        drop_follow_feed(user_id)
+
+
+def _source_range(source, limit, before=None):
+    """
+    Первые limit постов источника парами (pub_date, id), новые первыми,
+    после курсора before: диапазон по индексу (автор или группа,
+    -pub_date, -id).
+    """
+    posts = _feed_queryset(source)
+    if before is not None:
+        pub_date, pk = before
+        posts = posts.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+        )
+    return posts.values_list('pub_date', 'id')[:limit]
+
+
+def _merge(sources, limit, before=None):
+    pairs = []
+    seen = set()
+    ranges = [_source_range(source, limit, before) for source in sources]
+    for pair in heapq.merge(*ranges, reverse=True):
+        if pair[1] in seen:
+            continue
+        seen.add(pair[1])
+        pairs.append(pair)
+        if len(pairs) == limit:
+            break
+    return pairs
+
+
+def merge_sources(sources, limit):
+    """
+    k-путевое слияние источников кучей по (pub_date, id): из каждого
+    берётся не больше limit постов, объединение в SQL не строится.
+    Пост автора в группе, на которую тоже подписаны, идёт один раз.
+    """
+    return [pk for _, pk in _merge(sources, limit)]
+
+
+def _count(author_ids, group_ids):
+    """
+    Размер ленты без объединения: посты авторов плюс посты групп
+    минус посты подписанных авторов в подписанных группах.
+    """
+    by_authors = Post.objects.filter(author_id__in=author_ids).count()
+    if not group_ids:
+        return by_authors
+    in_groups = Post.objects.filter(group_id__in=group_ids).count()
+    both = Post.objects.filter(
+        author_id__in=author_ids, group_id__in=group_ids
+    ).count() if author_ids else 0
+    return by_authors + in_groups - both
+
+
+def follow_feed(user_id):
+    """
+    Лента подписок на авторов и группы; в кеше — первые
+    FOLLOW_FEED_SIZE id, собранные merge_sources.
+    """
+    key = _follow_key(user_id)
+    entry = cache.get(key)
+    if entry is not None:
+        return FollowFeed(entry)
+    version = cache.get(_version_key(_follow_name(user_id)))
+    author_ids = list(Follow.objects.filter(
+        user_id=user_id
+    ).values_list('author_id', flat=True))
+    group_ids = list(GroupFollow.objects.filter(
+        user_id=user_id
+    ).values_list('group_id', flat=True))
+    sources = [author_feed(pk) for pk in author_ids]
+    sources += [group_feed(pk) for pk in group_ids]
+    # В обратный индекс записываемся до чтения постов: новый пост
+    # после этого момента сбросит ленту или изменит версию.
+    registered = _register(user_id, sources)
+    size = settings.FOLLOW_FEED_SIZE
+    pairs = _merge(sources, size + 1)
+    entry = {
+        'ids': [pk for _, pk in pairs[:size]],
+        # Если все посты влезли, отдельный подсчёт не нужен.
+        'count': (
+            len(pairs) if len(pairs) <= size
+            else _count(author_ids, group_ids)
+        ),
+        'sources': sources,
+        'cursor': pairs[size - 1] if len(pairs) > size else None,
+        # Курсоры страниц этой сборки ленты; новая сборка их не видит.
+        'token': uuid.uuid4().hex,
+    }
+    current = cache.get(_version_key(_follow_name(user_id)))
+    if registered and current == version:
+        cache.add(key, entry, settings.FEED_IDS_TIMEOUT)
+    return FollowFeed(entry)
+
+
+def _object_prefix(model):
+    # update() и bulk_create() идут мимо сигналов — тогда устаревают
+    # все объекты модели сразу.
+    version = bulk_version(model._meta.db_table)
+    return f'obj:{version}:{model._meta.label_lower}:'
+
+
+def forget_object(model, pk):
+    cache.delete(f'{_object_prefix(model)}{pk}')
+
+
+def cached_objects(model, ids, load=None):
+    """Объекты по id: из кеша, недостающие — одним in_bulk."""
+    prefix = _object_prefix(model)
+    keys = {pk: f'{prefix}{pk}' for pk in ids}
+    found = cache.get_many(keys.values())
+    objects = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [pk for pk in keys if pk not in objects]
+    if missing:
+        loaded = (load or model._default_manager.in_bulk)(missing)
+        cache.set_many(
+            {keys[pk]: obj for pk, obj in loaded.items()},
+            settings.OBJECT_CACHE_TIMEOUT,
+        )
+        objects.update(loaded)
+    return objects
+
+
+def _load_posts(ids):
+    """
+    Недостающие посты грузим вместе с авторами и группами и кладём
+    тех в кеш отдельно: в записи поста связанных объектов нет.
+    """
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    users, groups = _object_prefix(User), _object_prefix(Group)
+    related = {}
+    for post in posts.values():
+        related[f'{users}{post.author_id}'] = post.author
+        if post.group_id:
+            related[f'{groups}{post.group_id}'] = post.group
+        post._state.fields_cache = {}
+    cache.set_many(related, settings.OBJECT_CACHE_TIMEOUT)
+    return posts
+
+
+def hydrate(ids):
+    """Посты с авторами и группами в порядке ids; удалённые пропускаются."""
+    posts = cached_objects(Post, ids, load=_load_posts)
+    authors = cached_objects(
+        User, {post.author_id for post in posts.values()}
+    )
+    groups = cached_objects(Group, {
+        post.group_id for post in posts.values() if post.group_id
+    })
+    result = []
+    for pk in ids:
+        post = posts.get(pk)
+        if post is None or post.author_id not in authors:
+            continue
+        post.author = authors[post.author_id]
+        post.group = groups.get(post.group_id)
+        result.append(post)
+    return result
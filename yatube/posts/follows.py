@@ -0,0 +1,42 @@
+from .models import Follow
+
+FOLLOWS_PER_PAGE = 20
+
+# Вид списка: поле владельца в Follow и поле пользователей строки
+FOLLOW_LISTS = {
+    'followers': ('author', 'user'),
+    'following': ('user', 'author'),
+}
+
+
+def parse_cursor(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def follow_page(owner, kind, cursor=None, size=None):
+    """
+    Страница подписчиков или подписок owner по курсору: строки с id
+    меньше курсора по убыванию id. Запрос идёт по индексу (author, -id)
+    или (user, -id) и не зависит от номера страницы, в отличие от OFFSET.
+    Возвращает пользователей и курсор следующей страницы (или None).
+    """
+    field, related = FOLLOW_LISTS[kind]
+    size = size or FOLLOWS_PER_PAGE
+    rows = Follow.objects.filter(**{field: owner})
+    if cursor is not None:
+        rows = rows.filter(id__lt=cursor)
+    rows = list(rows.select_related(related).order_by('-id')[:size + 1])
+    next_cursor = rows[size - 1].id if len(rows) > size else None
+    return [getattr(row, related) for row in rows[:size]], next_cursor
+
+
+def followed_ids(viewer, users):
+    """id тех из users, на кого подписан viewer, — одним запросом."""
+    if not viewer.is_authenticated or not users:
+        return set()
+    return set(Follow.objects.filter(
+        user=viewer, author__in=[user.pk for user in users]
+    ).values_list('author_id', flat=True))
@@ -0,0 +1,108 @@
+from django.template.loader import render_to_string
+
+from core.holes import register
+
+from . import reactions
+from . import recommendations as recs
+from . import view_counts
+from .forms import CommentForm
+from .models import Follow, GroupFollow, Reaction
+
+
+@register('switcher')
+def switcher(request):
+    return render_to_string(
+        'includes/switcher.html', {'index': True}, request=request
+    )
+
+
+@register('follow_button')
+def follow_button(request, author_id, username):
+    if request.user.pk == author_id:
+        return ''
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(
+            user=request.user, author_id=author_id
+        ).exists()
+    )
+    return render_to_string(
+        'includes/follow_button.html',
+        {'following': following, 'username': username},
+        request=request,
+    )
+
+
+@register('group_follow_button')
+def group_follow_button(request, group_id, slug):
+    following = (
+        request.user.is_authenticated
+        and GroupFollow.objects.filter(
+            user=request.user, group_id=group_id
+        ).exists()
+    )
+    return render_to_string(
+        'includes/group_follow_button.html',
+        {'following': following, 'slug': slug},
+        request=request,
+    )
+
+
+@register('edit_button')
+def edit_button(request, post_id, author_id):
+    if request.user.pk != author_id:
+        return ''
+    return render_to_string(
+        'includes/edit_button.html', {'post_id': post_id}, request=request
+    )
+
+
+@register('view_count')
+def view_count(request, post_id):
+    """Засчитывает просмотр и в кешированной странице поста."""
+    view_counts.record(post_id)
+    return str(view_counts.count(post_id))
+
+
+@register('comment_form')
+def comment_form(request, post_id):
+    return render_to_string(
+        'includes/comment_form.html',
+        {'form': CommentForm(), 'post_id': post_id},
+        request=request,
+    )
+
+
+@register('recommendations')
+def recommendations(request):
+    if not request.user.is_authenticated:
+        return ''
+    users = recs.for_user(request.user)
+    if not users:
+        return ''
+    return render_to_string(
+        'includes/recommendations.html', {'users': users}, request=request
+    )
+
+
+def _page_reactions(request, calls):
+    return reactions.summary([post_id for post_id, in calls], request.user)
+
+
+@register('reactions', prefetch=_page_reactions)
+def reaction_bar(request, summary, post_id):
+    counts, mine = summary
+    kinds = [
+        {
+            'kind': kind,
+            'label': label,
+            'count': counts.get((post_id, kind), 0),
+            'mine': (post_id, kind) in mine,
+        }
+        for kind, label in Reaction.KINDS
+    ]
+    return render_to_string(
+        'includes/reactions.html',
+        {'post_id': post_id, 'kinds': kinds},
+        request=request,
+    )
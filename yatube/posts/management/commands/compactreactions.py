@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.reactions import compact
+
+
+class Command(BaseCommand):
+    help = (
+        'Сливает части счётчиков реакций в одну строку на пост и вид. '
+        'Запускается периодически, например из cron.'
+    )
+
+    def handle(self, *args, **options):
+        deleted = compact()
+        self.stdout.write(f'Удалено частей счётчиков: {deleted}')
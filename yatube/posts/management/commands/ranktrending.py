@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг популярных постов и групп и удаляет '
+        'счётчики вне окна. Запускается периодически, например из cron.'
+    )
+
+    def handle(self, *args, **options):
+        deleted = trending.prune()
+        ranking = trending.refresh()
+        self.stdout.write(
+            f'Удалено счётчиков: {deleted}, в рейтинге постов: '
+            f'{len(ranking["post"])}, групп: {len(ranking["group"])}'
+        )
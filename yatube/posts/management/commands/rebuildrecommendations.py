@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.recommendations import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации «кого почитать» по графу подписок. '
+        'Запускается периодически, например из cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--per-user', type=int,
+            help='Сколько рекомендаций хранить на пользователя.'
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild(options['per_user'])
+        self.stdout.write(f'Рекомендаций: {total}')
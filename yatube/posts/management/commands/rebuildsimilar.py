@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.similar import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие посты по TF-IDF для всех постов. '
+        'Новые и изменённые посты обновляются задачей в очереди.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--per-post', type=int,
+            help='Сколько соседей хранить на пост.'
+        )
+
+    def handle(self, *args, **options):
+        total = rebuild(options['per_post'])
+        self.stdout.write(f'Пар соседей: {total}')
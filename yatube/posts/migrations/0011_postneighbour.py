@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_recommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostNeighbour',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Косинусная близость')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post', verbose_name='Похожий пост')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'ordering': ['-score'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postneighbour',
+            index=models.Index(fields=['post', '-score'], name='neighbour_post_score_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='postneighbour',
+            unique_together={('post', 'neighbour')},
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_postneighbour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(choices=[('post', 'Пост'), ('group', 'Группа')], max_length=5, verbose_name='Объект')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id объекта')),
+                ('resolution', models.CharField(choices=[('minute', 'Минута'), ('hour', 'Час')], max_length=6, verbose_name='Интервал')),
+                ('bucket', models.DateTimeField(verbose_name='Начало интервала')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='activitycounter',
+            index=models.Index(fields=['resolution', 'bucket'], name='activity_bucket_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='activitycounter',
+            unique_together={('target', 'object_id', 'resolution', 'bucket')},
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0014_postviewcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReactionCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('like', 'Нравится'), ('fire', 'Огонь'), ('sad', 'Грустно')], max_length=10, verbose_name='Реакция')),
+                ('shard', models.PositiveSmallIntegerField(verbose_name='Номер части')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reaction_counters', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'unique_together': {('post', 'kind', 'shard')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Reaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('like', 'Нравится'), ('fire', 'Огонь'), ('sad', 'Грустно')], max_length=10, verbose_name='Реакция')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата реакции')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reactions', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reactions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'unique_together': {('user', 'post', 'kind')},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_reactions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermFrequency',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=32, unique=True, verbose_name='Основа слова')),
+                ('posts', models.IntegerField(default=0, verbose_name='Постов')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=32, verbose_name='Основа слова')),
+                ('weight', models.FloatField(verbose_name='Вес')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='posts.Post', verbose_name='Пост')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='postterm',
+            index=models.Index(fields=['term'], name='post_term_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='postterm',
+            unique_together={('post', 'term')},
+        ),
+    ]
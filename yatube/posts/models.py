@@ -1,12 +1,16 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.queryset_cache import CachedQuerySet
+
 User = get_user_model()
 
 POST_PREVIEW = 15
 
 
 class Group(models.Model):
+    objects = CachedQuerySet.as_manager()
+
     title = models.CharField(max_length=200, verbose_name='Название группы')
     slug = models.SlugField(
         unique=True,
@@ -19,6 +23,8 @@ class Group(models.Model):
 
 
 class Post(models.Model):
+    objects = CachedQuerySet.as_manager()
+
     text = models.TextField(
         verbose_name='Текст записи',
         help_text='Введите текст поста'
@@ -53,9 +59,22 @@ class Post(models.Model):
 
     class Meta:
         ordering = ['-pub_date']
+        # Диапазоны лент автора и группы для слияния ленты подписок
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_idx',
+            ),
+        ]
 
 
 class Comment(models.Model):
+    objects = CachedQuerySet.as_manager()
+
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -86,6 +105,8 @@ class Comment(models.Model):
 
 
 class Follow(models.Model):
+    objects = CachedQuerySet.as_manager()
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -98,3 +119,230 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Подписчик',
     )
+
+    class Meta:
+        # Списки подписчиков и подписок листаются по курсору id
+        indexes = [
+            models.Index(
+                fields=['author', '-id'], name='follow_author_id_idx'
+            ),
+            models.Index(fields=['user', '-id'], name='follow_user_id_idx'),
+        ]
+
+
+class GroupFollow(models.Model):
+    objects = CachedQuerySet.as_manager()
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='group_follows',
+        verbose_name='Подписчик',
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='followers',
+        verbose_name='Группа',
+    )
+
+    class Meta:
+        unique_together = ['user', 'group']
+
+
+class Recommendation(models.Model):
+    """Кого почитать: готовые результаты manage.py rebuildrecommendations."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name='Пользователь',
+    )
+    candidate = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рекомендуемый автор',
+    )
+    score = models.PositiveIntegerField(verbose_name='Общих подписок')
+
+    class Meta:
+        ordering = ['-score', 'candidate_id']
+        indexes = [
+            models.Index(
+                fields=['user', '-score'], name='recommendation_user_idx'
+            ),
+        ]
+
+
+class PostNeighbour(models.Model):
+    """Похожие посты: ближайшие по TF-IDF, см. posts.similar."""
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='neighbours',
+        verbose_name='Пост',
+    )
+    neighbour = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий пост',
+    )
+    score = models.FloatField(verbose_name='Косинусная близость')
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ['post', 'neighbour']
+        indexes = [
+            models.Index(
+                fields=['post', '-score'], name='neighbour_post_score_idx'
+            ),
+        ]
+
+
+class PostTerm(models.Model):
+    """
+    Слово поста и его вес в нормированном векторе TF-IDF на момент
+    индексации: по этим строкам similar.update_post сравнивает новый
+    пост с остальными, не перечитывая корпус.
+    """
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='terms',
+        verbose_name='Пост',
+    )
+    term = models.CharField(max_length=32, verbose_name='Основа слова')
+    weight = models.FloatField(verbose_name='Вес')
+
+    class Meta:
+        unique_together = ['post', 'term']
+        indexes = [
+            models.Index(fields=['term'], name='post_term_idx'),
+        ]
+
+
+class TermFrequency(models.Model):
+    """В скольких постах встречается слово (документная частота)."""
+
+    term = models.CharField(
+        max_length=32, unique=True, verbose_name='Основа слова'
+    )
+    posts = models.IntegerField(default=0, verbose_name='Постов')
+
+
+class ActivityCounter(models.Model):
+    """
+    Сколько постов и комментариев набрал пост или группа за минуту
+    или за час; из счётчиков считается рейтинг posts.trending.
+    """
+    POST = 'post'
+    GROUP = 'group'
+    TARGETS = (
+        (POST, 'Пост'),
+        (GROUP, 'Группа'),
+    )
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    RESOLUTIONS = (
+        (MINUTE, 'Минута'),
+        (HOUR, 'Час'),
+    )
+
+    target = models.CharField(
+        max_length=5, choices=TARGETS, verbose_name='Объект'
+    )
+    object_id = models.PositiveIntegerField(verbose_name='id объекта')
+    resolution = models.CharField(
+        max_length=6, choices=RESOLUTIONS, verbose_name='Интервал'
+    )
+    bucket = models.DateTimeField(verbose_name='Начало интервала')
+    posts = models.PositiveIntegerField(default=0, verbose_name='Постов')
+    comments = models.PositiveIntegerField(
+        default=0, verbose_name='Комментариев'
+    )
+
+    class Meta:
+        unique_together = ['target', 'object_id', 'resolution', 'bucket']
+        indexes = [
+            models.Index(
+                fields=['resolution', 'bucket'], name='activity_bucket_idx'
+            ),
+        ]
+
+
+class PostViewCount(models.Model):
+    """Просмотры поста; пишутся пачками из буфера posts.view_counts."""
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='view_count',
+        verbose_name='Пост',
+    )
+    count = models.PositiveIntegerField(
+        default=0, db_index=True, verbose_name='Просмотров'
+    )
+
+
+class Reaction(models.Model):
+    """Реакция пользователя на пост: одна каждого вида."""
+    LIKE = 'like'
+    FIRE = 'fire'
+    SAD = 'sad'
+    KINDS = (
+        (LIKE, 'Нравится'),
+        (FIRE, 'Огонь'),
+        (SAD, 'Грустно'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='reactions',
+        verbose_name='Пользователь',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='reactions',
+        verbose_name='Пост',
+    )
+    kind = models.CharField(
+        max_length=10, choices=KINDS, verbose_name='Реакция'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name='Дата реакции'
+    )
+
+    class Meta:
+        unique_together = ['user', 'post', 'kind']
+
+
+class ReactionCounter(models.Model):
+    """
+    Часть счётчика реакций: у поста до REACTION_SHARDS строк на вид,
+    реакция меняет случайную, и популярный пост не упирается в
+    блокировку одной строки. Итог — сумма; compactreactions сливает
+    строки обратно.
+    """
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='reaction_counters',
+        verbose_name='Пост',
+    )
+    kind = models.CharField(
+        max_length=10, choices=Reaction.KINDS, verbose_name='Реакция'
+    )
+    shard = models.PositiveSmallIntegerField(verbose_name='Номер части')
+    count = models.IntegerField(default=0, verbose_name='Количество')
+
+    class Meta:
+        unique_together = ['post', 'kind', 'shard']
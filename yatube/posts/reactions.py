@@ -0,0 +1,104 @@
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, IntegerField, Sum, Value
+
+from .models import Reaction, ReactionCounter
+
+
+def _bump(post_id, kind, delta):
+    """Меняет случайную часть счётчика; строку создаёт первая реакция."""
+    shard = random.randrange(settings.REACTION_SHARDS)
+    counter = ReactionCounter.objects.filter(
+        post_id=post_id, kind=kind, shard=shard
+    )
+    if counter.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            ReactionCounter.objects.create(
+                post_id=post_id, kind=kind, shard=shard, count=delta
+            )
+    except IntegrityError:
+        counter.update(count=F('count') + delta)
+
+
+def toggle(user, post_id, kind):
+    """Ставит или снимает реакцию; возвращает True, если поставлена."""
+    with transaction.atomic():
+        removed, _ = Reaction.objects.filter(
+            user=user, post_id=post_id, kind=kind
+        ).delete()
+        if removed:
+            _bump(post_id, kind, -1)
+            return False
+        try:
+            with transaction.atomic():
+                Reaction.objects.create(user=user, post_id=post_id, kind=kind)
+        except IntegrityError:
+            # Та же реакция пришла параллельным запросом.
+            return True
+        _bump(post_id, kind, 1)
+        return True
+
+
+def summary(post_ids, user):
+    """
+    Итоги реакций на посты страницы и реакции самого user — одним
+    запросом: суммы частей счётчиков UNION ALL строки пользователя.
+    Возвращает ({(post_id, kind): count}, {(post_id, kind), ...}).
+    """
+    counts = ReactionCounter.objects.filter(
+        post_id__in=post_ids
+    ).order_by().values('post_id', 'kind').annotate(
+        total=Sum('count'), mine=Value(0, output_field=IntegerField()),
+    ).values_list('post_id', 'kind', 'total', 'mine')
+    if user.is_authenticated:
+        counts = counts.union(
+            Reaction.objects.filter(
+                user=user, post_id__in=post_ids
+            ).order_by().annotate(
+                total=Value(0, output_field=IntegerField()),
+                mine=Value(1, output_field=IntegerField()),
+            ).values_list('post_id', 'kind', 'total', 'mine'),
+            all=True,
+        )
+    totals = defaultdict(int)
+    mine = set()
+    for post_id, kind, total, own in counts:
+        if own:
+            mine.add((post_id, kind))
+        else:
+            totals[post_id, kind] += total
+    return dict(totals), mine
+
+
+def compact():
+    """
+    Сливает части счётчиков каждого поста и вида в одну строку: к ней
+    прибавляется сумма остальных, те удаляются по id, так что реакции,
+    пришедшие во время сжатия, не теряются. Возвращает число удалённых.
+    """
+    rows = defaultdict(list)
+    for pk, post_id, kind, count in ReactionCounter.objects.order_by(
+        'shard'
+    ).values_list('pk', 'post_id', 'kind', 'count'):
+        rows[post_id, kind].append((pk, count))
+    deleted = 0
+    for shards in rows.values():
+        if len(shards) < 2:
+            continue
+        (keeper, _), rest = shards[0], shards[1:]
+        with transaction.atomic():
+            locked = dict(ReactionCounter.objects.select_for_update().filter(
+                pk__in=[pk for pk, _ in rest]
+            ).values_list('pk', 'count'))
+            ReactionCounter.objects.filter(pk=keeper).update(
+                count=F('count') + sum(locked.values())
+            )
+            deleted += ReactionCounter.objects.filter(
+                pk__in=list(locked)
+            ).delete()[0]
+    return deleted
@@ -0,0 +1,75 @@
+"""
+Области общих страниц для versioned_page_key: страница группы, автора
+и поста устаревает только при изменении своих данных, а не при любой
+записи на сайте.
+"""
+from django.contrib.auth import get_user_model
+
+from core.page_cache import invalidate_pages
+
+from . import feeds
+from .models import Group
+
+User = get_user_model()
+
+# Каталог групп: число постов и последний пост каждой группы.
+GROUPS = 'groups'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def group_scopes(slug):
+    return [group_scope(slug)]
+
+
+def profile_scopes(username):
+    return [profile_scope(username)]
+
+
+def post_scopes(post_id):
+    """Пост и его автор: на странице поста — число постов автора."""
+    # Пост с автором — из кеша объектов, холодный кеш — один запрос.
+    posts = feeds.hydrate([post_id])
+    return [post_scope(post_id)] + [
+        profile_scope(post.author.username) for post in posts
+    ]
+
+
+def _author_scopes(author_id):
+    author = feeds.cached_objects(User, [author_id]).get(author_id)
+    return [] if author is None else [profile_scope(author.username)]
+
+
+def _group_scopes(group_id):
+    if group_id is None:
+        return []
+    group = feeds.cached_objects(Group, [group_id]).get(group_id)
+    return [] if group is None else [group_scope(group.slug)]
+
+
+def post_changed(post, old_group_id, listed):
+    """
+    Пост изменён: его страница, профиль автора и страницы групп.
+    listed — пост появился, исчез или сменил группу, тогда меняется
+    и каталог групп.
+    """
+    scopes = [
+        post_scope(post.pk),
+        *_author_scopes(post.author_id),
+        *_group_scopes(post.group_id),
+    ]
+    if old_group_id != post.group_id:
+        scopes.extend(_group_scopes(old_group_id))
+    if listed:
+        scopes.append(GROUPS)
+    invalidate_pages(*scopes)
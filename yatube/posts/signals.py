@@ -0,0 +1,136 @@
+from copy import copy
+from functools import partial, wraps
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+
+from core.page_cache import invalidate_pages
+from core.queryset_cache import watch
+
+from . import feeds, shells, similar, tasks
+from .models import Comment, Follow, Group, GroupFollow, Post
+
+User = get_user_model()
+
+
+def after_commit(receiver):
+    """
+    Обработчик сигнала — после фиксации транзакции: до неё другие
+    соединения и реплики видят старые строки и закешировали бы их снова.
+    Получает копию объекта: после удаления у самого объекта pk уже None.
+    """
+    @wraps(receiver)
+    def deferred(sender, instance, using, **kwargs):
+        transaction.on_commit(
+            partial(receiver, sender, copy(instance), **kwargs), using=using
+        )
+    return deferred
+
+
+@after_commit
+def comment_changed(sender, instance, **kwargs):
+    invalidate_pages(shells.post_scope(instance.post_id))
+
+
+@after_commit
+def group_changed(sender, instance, **kwargs):
+    # Название группы есть на страницах её постов и в профилях авторов;
+    # группы правят редко — сбрасываем все страницы.
+    invalidate_pages()
+
+
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    after_commit(_user_changed)(sender, instance, **kwargs)
+
+
+def _user_changed(sender, instance, **kwargs):
+    invalidate_pages(shells.profile_scope(instance.username))
+
+
+for model, receiver in (
+    (Comment, comment_changed), (Group, group_changed), (User, user_changed),
+):
+    post_save.connect(receiver, sender=model)
+    post_delete.connect(receiver, sender=model)
+
+watch(Post, Comment, Group, Follow, GroupFollow, User)
+
+
+def remember_state(sender, instance, **kwargs):
+    instance._feed_group_id = instance.group_id
+    instance._saved_image = instance.image.name
+    instance._saved_text = instance.text
+
+
+def post_saved(sender, instance, created, **kwargs):
+    old_group_id = getattr(instance, '_feed_group_id', instance.group_id)
+    old_image = getattr(instance, '_saved_image', None)
+    if instance.image and instance.image.name != old_image:
+        tasks.make_thumbnails.delay(instance.pk)
+    if created or instance.text != getattr(instance, '_saved_text', None):
+        tasks.update_similar.delay(instance.pk)
+    after_commit(update_feeds)(
+        sender, instance, created=created, old_group_id=old_group_id,
+        **kwargs
+    )
+    remember_state(sender, instance)
+
+
+def update_feeds(sender, instance, created, old_group_id, **kwargs):
+    feeds.forget_object(Post, instance.pk)
+    if created:
+        feeds.add_post(instance)
+        feeds.drop_subscriber_feeds(
+            *feeds.post_sources(instance, instance.group_id)
+        )
+    elif old_group_id != instance.group_id:
+        feeds.move_post(instance, old_group_id)
+        feeds.drop_subscriber_feeds(
+            *feeds.post_sources(instance, old_group_id),
+            *feeds.post_sources(instance, instance.group_id),
+        )
+    shells.post_changed(
+        instance, old_group_id,
+        listed=created or old_group_id != instance.group_id,
+    )
+
+
+def post_deleting(sender, instance, **kwargs):
+    # Слова поста удалятся каскадом раньше post_delete.
+    similar.forget_post(instance.pk)
+
+
+@after_commit
+def post_deleted(sender, instance, **kwargs):
+    feeds.forget_object(Post, instance.pk)
+    feeds.remove_post(instance)
+    feeds.drop_subscriber_feeds(
+        *feeds.post_sources(instance, instance.group_id)
+    )
+    shells.post_changed(instance, instance.group_id, listed=True)
+
+
+@after_commit
+def follow_changed(sender, instance, **kwargs):
+    feeds.drop_follow_feed(instance.user_id)
+
+
+@after_commit
+def object_changed(sender, instance, **kwargs):
+    feeds.forget_object(sender, instance.pk)
+
+
+post_init.connect(remember_state, sender=Post)
+post_save.connect(post_saved, sender=Post)
+pre_delete.connect(post_deleting, sender=Post)
+post_delete.connect(post_deleted, sender=Post)
+for model in (Follow, GroupFollow):
+    post_save.connect(follow_changed, sender=model)
+    post_delete.connect(follow_changed, sender=model)
+for model in (Group, User):
+    post_save.connect(object_changed, sender=model)
+    post_delete.connect(object_changed, sender=model)
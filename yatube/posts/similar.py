@@ -0,0 +1,272 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+
+from core.page_cache import invalidate_pages
+
+from .models import Post, PostNeighbour, PostTerm, TermFrequency
+from .shells import post_scope
+
+TOKEN = re.compile(r'[a-zа-я]+')
+STEM_LENGTH = 6
+MIN_SCORE = 0.05
+CHUNK_SIZE = 500
+STOP_WORDS = frozenset('''
+    это как так что его она они оно все был была были быть для при или уже
+    еще тот там тут где кто чем без над под ним нем них мне меня тебя себя
+    вот только когда даже если чтобы очень нас вас вам нам их мой моя мое
+    the and for are was were with this that from have has not but you your
+    its they them his her our out all can will would there their what
+'''.split())
+# Слово, которое «есть» в каждом проиндексированном посте: его
+# документная частота — размер корпуса.
+DOCUMENTS = ''
+
+
+def tokenize(text):
+    """
+    Слова русского и английского текста без стоп-слов. Основа слова —
+    первые STEM_LENGTH букв: грубая замена стеммера, которая склеивает
+    падежи и времена обоих языков.
+    """
+    words = TOKEN.findall(text.lower().replace('ё', 'е'))
+    return [
+        word[:STEM_LENGTH] for word in words
+        if len(word) > 2 and word not in STOP_WORDS
+    ]
+
+
+def _weights(terms, df, total):
+    """
+    Нормированные веса TF-IDF слов поста. Слово из всех постов получает
+    нулевой вес, отдельный список стоп-слов для них не нужен.
+    """
+    weights = {
+        term: (1 + math.log(count)) * math.log(total / df[term])
+        for term, count in terms.items()
+    }
+    norm = math.sqrt(sum(weight ** 2 for weight in weights.values()))
+    return {
+        term: weight / norm if norm else 0.0
+        for term, weight in weights.items()
+    }
+
+
+def _index_rows(post_id, weights):
+    """Строки PostTerm поста, включая DOCUMENTS для счёта корпуса."""
+    return [
+        PostTerm(post_id=post_id, term=term, weight=weight)
+        for term, weight in {**weights, DOCUMENTS: 0.0}.items()
+    ]
+
+
+class Corpus:
+    """Частоты слов в каждом посте и документная частота по корпусу."""
+
+    def __init__(self, texts):
+        """texts — пары (id поста, текст)."""
+        self.terms = {}
+        self.df = Counter()
+        for pk, text in texts:
+            terms = Counter(tokenize(text))
+            self.terms[pk] = terms
+            self.df.update(terms.keys())
+
+    @classmethod
+    def load(cls):
+        return cls(Post.objects.values_list('id', 'text').iterator())
+
+    def weights(self, pk):
+        return _weights(self.terms[pk], self.df, len(self.terms))
+
+    def vector(self, pk):
+        """Нормированный разреженный вектор TF-IDF поста (dict)."""
+        return {
+            term: weight for term, weight in self.weights(pk).items()
+            if weight > 0
+        }
+
+
+def _top(scores, k):
+    best = heapq.nlargest(
+        k, scores.items(), key=lambda item: (item[1], -item[0])
+    )
+    return [(pk, score) for pk, score in best if score >= MIN_SCORE]
+
+
+def nearest(corpus, k):
+    """
+    Для каждого поста — топ-k соседей по косинусу. Скалярные
+    произведения считаются по инвертированному индексу: пост
+    сравнивается только с постами, где есть его слова.
+    """
+    vectors = {pk: corpus.vector(pk) for pk in corpus.terms}
+    postings = defaultdict(list)
+    for pk, vector in vectors.items():
+        for term, weight in vector.items():
+            postings[term].append((pk, weight))
+    for pk, vector in vectors.items():
+        scores = defaultdict(float)
+        for term, weight in vector.items():
+            for other, other_weight in postings[term]:
+                scores[other] += weight * other_weight
+        scores.pop(pk, None)
+        yield pk, _top(scores, k)
+
+
+def _rows(post_id, neighbours):
+    return [
+        PostNeighbour(post_id=post_id, neighbour_id=other, score=score)
+        for other, score in neighbours
+    ]
+
+
+def _rebuild_index(corpus):
+    """Документные частоты и веса слов всех постов для update_post."""
+    TermFrequency.objects.all().delete()
+    PostTerm.objects.all().delete()
+    TermFrequency.objects.bulk_create([
+        TermFrequency(term=term, posts=posts)
+        for term, posts in corpus.df.items()
+    ] + [TermFrequency(term=DOCUMENTS, posts=len(corpus.terms))],
+        batch_size=CHUNK_SIZE,
+    )
+    chunk = []
+    for pk in corpus.terms:
+        chunk.extend(_index_rows(pk, corpus.weights(pk)))
+        if len(chunk) >= CHUNK_SIZE:
+            PostTerm.objects.bulk_create(chunk)
+            chunk = []
+    PostTerm.objects.bulk_create(chunk)
+
+
+def rebuild(k=None):
+    """
+    Пересчитывает таблицу соседей и индекс слов; возвращает число
+    строк соседей.
+    """
+    k = k or settings.SIMILAR_POSTS_PER_POST
+    corpus = Corpus.load()
+    total = 0
+    with transaction.atomic():
+        _rebuild_index(corpus)
+        PostNeighbour.objects.all().delete()
+        chunk = []
+        for pk, neighbours in nearest(corpus, k):
+            chunk.extend(_rows(pk, neighbours))
+            if len(chunk) >= CHUNK_SIZE:
+                PostNeighbour.objects.bulk_create(chunk)
+                total += len(chunk)
+                chunk = []
+        PostNeighbour.objects.bulk_create(chunk)
+        transaction.on_commit(invalidate_pages)
+    return total + len(chunk)
+
+
+def _trim(post_id, k):
+    extra = list(
+        PostNeighbour.objects.filter(post_id=post_id)
+        .values_list('id', flat=True)[k:]
+    )
+    if extra:
+        PostNeighbour.objects.filter(id__in=extra).delete()
+
+
+def _count_posts(terms, delta):
+    """Меняет документные частоты слов terms на delta."""
+    if not terms:
+        return
+    if delta > 0:
+        TermFrequency.objects.bulk_create(
+            [TermFrequency(term=term) for term in terms],
+            ignore_conflicts=True,
+        )
+    TermFrequency.objects.filter(term__in=terms).update(
+        posts=F('posts') + delta
+    )
+    if delta < 0:
+        TermFrequency.objects.filter(term__in=terms, posts__lte=0).delete()
+
+
+def _indexed_terms(post_id):
+    return set(
+        PostTerm.objects.filter(post_id=post_id)
+        .values_list('term', flat=True)
+    )
+
+
+def index_post(post_id, text):
+    """
+    Переиндексирует пост: правит частоты только его добавленных и
+    убранных слов и сохраняет его веса. Возвращает вектор поста.
+    """
+    terms = Counter(tokenize(text))
+    new = set(terms) | {DOCUMENTS}
+    old = _indexed_terms(post_id)
+    _count_posts(new - old, 1)
+    _count_posts(old - new, -1)
+    df = dict(
+        TermFrequency.objects.filter(term__in=new)
+        .values_list('term', 'posts')
+    )
+    weights = _weights(terms, df, df[DOCUMENTS])
+    PostTerm.objects.filter(post_id=post_id).delete()
+    PostTerm.objects.bulk_create(_index_rows(post_id, weights))
+    return {term: weight for term, weight in weights.items() if weight > 0}
+
+
+def forget_post(post_id):
+    """Убирает удаляемый пост из документных частот."""
+    _count_posts(_indexed_terms(post_id), -1)
+
+
+def update_post(post_id, k=None):
+    """
+    Соседи нового или изменённого поста без пересчёта всей таблицы:
+    вектор поста сравнивается с сохранёнными весами постов, где есть
+    его слова, и пост попадает в списки своих соседей, вытесняя из них
+    самых далёких. Веса остальных постов считаны при их индексации,
+    rebuild приводит их к текущим частотам.
+    """
+    k = k or settings.SIMILAR_POSTS_PER_POST
+    text = Post.objects.filter(
+        pk=post_id
+    ).values_list('text', flat=True).first()
+    if text is None:
+        return
+    with transaction.atomic():
+        vector = index_post(post_id, text)
+        scores = defaultdict(float)
+        for other, term, weight in PostTerm.objects.filter(
+            term__in=list(vector), weight__gt=0
+        ).exclude(post_id=post_id).values_list('post_id', 'term', 'weight'):
+            scores[other] += vector[term] * weight
+        neighbours = _top(scores, k)
+        stale = PostNeighbour.objects.filter(
+            Q(post_id=post_id) | Q(neighbour_id=post_id)
+        )
+        changed = {post_id, *(other for other, _ in neighbours)}
+        changed.update(stale.values_list('post_id', flat=True))
+        stale.delete()
+        PostNeighbour.objects.bulk_create(_rows(post_id, neighbours) + [
+            PostNeighbour(post_id=other, neighbour_id=post_id, score=score)
+            for other, score in neighbours
+        ])
+        for other, _ in neighbours:
+            _trim(other, k)
+        transaction.on_commit(
+            partial(invalidate_pages, *map(post_scope, changed))
+        )
+
+
+def for_post(post, limit=None):
+    """Похожие посты — один запрос по индексу (post, -score)."""
+    rows = post.neighbours.select_related('neighbour')
+    limit = limit or settings.SIMILAR_POSTS_SHOWN
+    return [row.neighbour for row in rows[:limit]]
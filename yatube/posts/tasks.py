@@ -0,0 +1,24 @@
+from sorl.thumbnail import get_thumbnail
+
+from core.tasks import task
+
+from . import similar
+from .models import Post
+
+# Те же параметры, что у {% thumbnail %} в шаблонах лент и поста.
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+@task
+def make_thumbnails(post_id):
+    """Готовит миниатюру заранее, чтобы её не строил запрос страницы."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None and post.image:
+        get_thumbnail(post.image, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS)
+
+
+@task
+def update_similar(post_id):
+    """Соседи нового или изменённого поста для блока «Похожие посты»."""
+    similar.update_post(post_id)
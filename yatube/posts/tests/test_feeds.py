@@ -0,0 +1,304 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.testing import run_on_commit
+from posts import feeds
+from posts.models import Follow, Group, GroupFollow, Post
+
+User = get_user_model()
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.other_group = Group.objects.create(title='Другая', slug='other')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост №{i}'
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.feeds = [
+            feeds.index_feed(),
+            feeds.group_feed(self.group.pk),
+            feeds.author_feed(self.author.pk),
+        ]
+        for feed in self.feeds:
+            feeds.hydrate(feeds.post_ids(feed))
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_warm_feed_needs_no_queries(self):
+        with self.assertNumQueries(0):
+            posts = feeds.hydrate(feeds.post_ids(feeds.index_feed()))
+        self.assertEqual(
+            [post.pk for post in posts],
+            list(Post.objects.values_list('pk', flat=True)),
+        )
+        self.assertEqual(posts[0].author.username, 'author')
+        self.assertEqual(posts[0].group.slug, 'group')
+
+    def test_new_post_prepended_to_cached_lists(self):
+        with run_on_commit():
+            post = Post.objects.create(
+                author=self.author, group=self.group, text='Новый'
+            )
+        for feed in self.feeds:
+            with self.subTest(feed=feed), self.assertNumQueries(0):
+                self.assertEqual(feeds.post_ids(feed)[0], post.pk)
+
+    def test_edit_invalidates_only_that_post(self):
+        post = self.posts[0]
+        post.text = 'Исправлен'
+        with run_on_commit():
+            post.save()
+        with self.assertNumQueries(1):
+            posts = feeds.hydrate(feeds.post_ids(feeds.index_feed()))
+        self.assertIn('Исправлен', [post.text for post in posts])
+
+    def test_deleted_post_removed_from_lists(self):
+        post = self.posts[1]
+        with run_on_commit():
+            post.delete()
+        for feed in self.feeds:
+            with self.subTest(feed=feed):
+                self.assertNotIn(post.pk, feeds.post_ids(feed))
+
+    def test_group_change_moves_post(self):
+        post = self.posts[2]
+        post.group = self.other_group
+        with run_on_commit():
+            post.save()
+        self.assertNotIn(
+            post.pk, feeds.post_ids(feeds.group_feed(self.group.pk))
+        )
+        self.assertIn(
+            post.pk, feeds.post_ids(feeds.group_feed(self.other_group.pk))
+        )
+
+    def test_bulk_create_rebuilds_lists(self):
+        with run_on_commit():
+            Post.objects.bulk_create([
+                Post(author=self.author, text='Пачкой')
+            ])
+        self.assertEqual(
+            len(feeds.post_ids(feeds.index_feed())), len(self.posts) + 1
+        )
+
+    def test_queryset_update_refreshes_cached_objects(self):
+        post = self.posts[0]
+        with run_on_commit():
+            Post.objects.filter(pk=post.pk).update(text='Изменён')
+        self.assertEqual(feeds.hydrate([post.pk])[0].text, 'Изменён')
+
+    @override_settings(FEED_SIZE=2)
+    def test_only_feed_head_cached(self):
+        cache.clear()
+        first, second, third = Post.objects.order_by(
+            'id'
+        ).values_list('id', flat=True)
+        feed = feeds.post_ids(feeds.index_feed())
+        self.assertEqual((feed.ids, len(feed)), ([third, second], 3))
+        with self.assertNumQueries(1):
+            self.assertEqual(list(feed[2:4]), [first])
+        with run_on_commit():
+            post = Post.objects.create(author=self.author, text='Новый')
+        feed = feeds.post_ids(feeds.index_feed())
+        self.assertEqual((feed.ids, len(feed)), ([post.pk, third], 4))
+        with run_on_commit():
+            Post.objects.get(pk=third).delete()
+        feed = feeds.post_ids(feeds.index_feed())
+        self.assertEqual((feed.ids, len(feed)), ([post.pk], 3))
+        self.assertEqual(list(feed[0:3]), [post.pk, second, first])
+
+    def test_head_without_reader_is_abstract(self):
+        with self.assertRaises(TypeError):
+            feeds.CachedHead({'ids': [], 'count': 0})
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост №{i}')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.ids = list(feeds.follow_feed(self.reader.pk)[:10])
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cached_after_first_build(self):
+        with self.assertNumQueries(0):
+            feed = feeds.follow_feed(self.reader.pk)
+            self.assertEqual(list(feed[:10]), self.ids)
+            self.assertEqual(len(feed), 3)
+
+    def test_followed_author_post_drops_feed(self):
+        with run_on_commit():
+            post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(feeds.follow_feed(self.reader.pk)[0], post.pk)
+
+    def test_other_authors_keep_feed(self):
+        with run_on_commit():
+            Post.objects.create(author=self.stranger, text='Чужой')
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                list(feeds.follow_feed(self.reader.pk)[:10]), self.ids
+            )
+
+    def test_follow_and_unfollow_drop_feed(self):
+        with run_on_commit():
+            post = Post.objects.create(author=self.stranger, text='Чужой')
+            follow = Follow.objects.create(
+                user=self.reader, author=self.stranger
+            )
+        self.assertIn(post.pk, feeds.follow_feed(self.reader.pk)[:10])
+        with run_on_commit():
+            follow.delete()
+        self.assertNotIn(post.pk, feeds.follow_feed(self.reader.pk)[:10])
+
+    def test_rebuild_skips_registered_sources(self):
+        with run_on_commit():
+            Follow.objects.create(user=self.reader, author=self.stranger)
+        feeds.follow_feed(self.reader.pk)
+        cache.delete(feeds._follow_key(self.reader.pk))
+        with mock.patch.object(feeds, '_update_locked') as update:
+            feeds.follow_feed(self.reader.pk)
+        update.assert_not_called()
+
+    @override_settings(FEED_FOLLOWERS_LIMIT=1)
+    def test_crowded_source_drops_feeds_from_database(self):
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=other, author=self.author)
+        feeds.follow_feed(other.pk)
+        self.assertEqual(
+            cache.get(feeds._followers_key(feeds.author_feed(self.author.pk))),
+            feeds.CROWDED,
+        )
+        with run_on_commit():
+            post = Post.objects.create(author=self.author, text='Новый')
+        for user in (self.reader, other):
+            with self.subTest(user=user.username):
+                self.assertEqual(feeds.follow_feed(user.pk)[0], post.pk)
+
+    @override_settings(FOLLOW_FEED_SIZE=2)
+    def test_far_pages_read_from_database(self):
+        cache.clear()
+        feed = feeds.follow_feed(self.reader.pk)
+        self.assertEqual(len(feed), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(list(feed[2:4]), [self.posts[0].pk])
+
+    @override_settings(FOLLOW_FEED_SIZE=1)
+    def test_deep_pages_continue_from_cursor(self):
+        for i in range(3):
+            Post.objects.create(author=self.author, text=f'Ещё №{i}')
+        cache.clear()
+        expected = feeds.merge_sources([feeds.author_feed(self.author.pk)], 10)
+        feed = feeds.follow_feed(self.reader.pk)
+        pages = []
+        for start in range(1, len(expected), 2):
+            with CaptureQueriesContext(connection) as queries:
+                pages += feed[start:start + 2]
+            # Страница за предыдущей: с её курсора, только две строки.
+            self.assertEqual(len(queries), 1)
+            self.assertIn('LIMIT 2', queries[0]['sql'])
+        self.assertEqual(expected[:1] + pages, expected)
+
+
+class GroupFollowFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        GroupFollow.objects.create(user=cls.reader, group=cls.group)
+        cls.posts = [
+            Post.objects.create(author=cls.author, text='Автор'),
+            Post.objects.create(
+                author=cls.stranger, group=cls.group, text='Группа'
+            ),
+            Post.objects.create(
+                author=cls.author, group=cls.group, text='Автор в группе'
+            ),
+            Post.objects.create(author=cls.stranger, text='Чужой'),
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_merges_authors_and_groups_without_duplicates(self):
+        feed = feeds.follow_feed(self.reader.pk)
+        self.assertEqual(
+            list(feed[:10]), [post.pk for post in self.posts[2::-1]]
+        )
+        self.assertEqual(len(feed), 3)
+
+    def test_merge_orders_by_pub_date_then_id(self):
+        early = self.posts[0]
+        Post.objects.filter(pk=self.posts[2].pk).update(
+            pub_date=early.pub_date
+        )
+        self.assertEqual(
+            feeds.merge_sources(
+                [feeds.author_feed(self.author.pk),
+                 feeds.group_feed(self.group.pk)], 10
+            ),
+            [self.posts[1].pk, self.posts[2].pk, early.pk],
+        )
+
+    @override_settings(FOLLOW_FEED_SIZE=1)
+    def test_count_and_far_pages_without_union(self):
+        feed = feeds.follow_feed(self.reader.pk)
+        self.assertEqual(len(feed), 3)
+        # По запросу на каждый источник: автор и группа.
+        with self.assertNumQueries(2):
+            self.assertEqual(
+                list(feed[1:3]), [self.posts[1].pk, self.posts[0].pk]
+            )
+
+    def test_new_group_post_drops_feed(self):
+        feeds.follow_feed(self.reader.pk)
+        with run_on_commit():
+            post = Post.objects.create(
+                author=self.stranger, group=self.group, text='Новый'
+            )
+        self.assertEqual(feeds.follow_feed(self.reader.pk)[0], post.pk)
+
+    def test_group_subscription_views(self):
+        self.client.force_login(self.stranger)
+        self.client.get(reverse('posts:group_follow', args=['group']))
+        self.assertTrue(GroupFollow.objects.filter(
+            user=self.stranger, group=self.group
+        ).exists())
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertIn(self.posts[2], response.context['page_obj'])
+        self.client.get(reverse('posts:group_unfollow', args=['group']))
+        self.assertFalse(GroupFollow.objects.filter(
+            user=self.stranger, group=self.group
+        ).exists())
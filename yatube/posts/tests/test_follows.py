@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import follows
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class FollowListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.viewer = User.objects.create_user(username='viewer')
+        cls.fans = [
+            User.objects.create_user(username=f'fan_{i}') for i in range(5)
+        ]
+        for fan in cls.fans:
+            Follow.objects.create(user=fan, author=cls.author)
+        Follow.objects.create(user=cls.viewer, author=cls.fans[0])
+        Follow.objects.create(user=cls.author, author=cls.fans[1])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.viewer)
+
+    def test_cursor_walks_all_followers_newest_first(self):
+        seen = []
+        cursor = None
+        while True:
+            users, cursor = follows.follow_page(
+                self.author, 'followers', cursor, size=2
+            )
+            seen.extend(user.username for user in users)
+            if cursor is None:
+                break
+        self.assertEqual(
+            seen, [fan.username for fan in reversed(self.fans)]
+        )
+
+    def test_following_list(self):
+        users, cursor = follows.follow_page(self.author, 'following')
+        self.assertEqual(users, [self.fans[1]])
+        self.assertIsNone(cursor)
+
+    def test_page_marks_followed_users(self):
+        response = self.client.get(
+            reverse('posts:followers', args=[self.author])
+        )
+        rows = {
+            row['user'].username: row['following']
+            for row in response.context['rows']
+        }
+        self.assertTrue(rows['fan_0'])
+        self.assertFalse(rows['fan_1'])
+
+    def test_api_returns_next_cursor(self):
+        url = reverse('posts:api_followers', args=[self.author])
+        with mock.patch.object(follows, 'FOLLOWS_PER_PAGE', 3):
+            first = self.client.get(url).json()
+            second = self.client.get(first['next']).json()
+        self.assertEqual(len(first['results']), 3)
+        self.assertEqual(
+            [row['username'] for row in second['results']],
+            ['fan_1', 'fan_0'],
+        )
+        self.assertTrue(second['results'][1]['following'])
+        self.assertIsNone(second['next'])
+
+    def test_following_flags_cost_one_query(self):
+        url = reverse('posts:api_following', args=[self.viewer])
+        self.client.get(url)
+        # Список (пользователи одним JOIN) и флаги «читаю».
+        with self.assertNumQueries(2):
+            self.client.get(url)
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.page_cache import CACHE_HEADER, HIT, MISS
+from core.testing import run_on_commit
+from posts.models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class SharedPageTests(TestCase):
+    """Страницы кешируются одни на всех, данные пользователя — дырки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_profile_shared_between_users(self):
+        url = reverse('posts:profile', args=[self.author.username])
+        anonymous = self.client.get(url)
+        reader = self.reader_client.get(url)
+        author = self.author_client.get(url)
+        self.assertEqual(anonymous[CACHE_HEADER], MISS)
+        self.assertEqual(reader[CACHE_HEADER], HIT)
+        self.assertEqual(author[CACHE_HEADER], HIT)
+        self.assertContains(anonymous, 'Подписаться')
+        self.assertContains(anonymous, 'Войти')
+        self.assertContains(reader, 'Отписаться')
+        self.assertContains(reader, 'Пользователь: reader')
+        self.assertNotContains(author, 'Подписаться')
+        self.assertNotContains(author, 'Отписаться')
+
+    def test_post_detail_holes(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(url)
+        reader = self.reader_client.get(url)
+        author = self.author_client.get(url)
+        self.assertEqual(reader[CACHE_HEADER], HIT)
+        self.assertNotContains(self.client.get(url), 'csrfmiddlewaretoken')
+        self.assertContains(reader, 'csrfmiddlewaretoken')
+        self.assertNotContains(reader, 'Редактировать')
+        self.assertContains(author, 'Редактировать')
+        self.assertIn('csrftoken', reader.cookies)
+
+    def test_changes_invalidate_shared_pages(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(url)
+        with run_on_commit():
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='Новый комментарий'
+            )
+        response = self.client.get(url)
+        self.assertEqual(response[CACHE_HEADER], MISS)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_login_does_not_invalidate(self):
+        url = reverse('posts:profile', args=[self.author.username])
+        self.client.get(url)
+        with run_on_commit():
+            update_last_login(None, self.reader)
+        self.assertEqual(self.client.get(url)[CACHE_HEADER], HIT)
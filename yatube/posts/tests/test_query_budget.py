@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.query_budget import (QueryBudgetExceeded, QueryBudgetMixin,
+                               capture_queries, check_budget)
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+DATA_SIZES = (1, 15)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.client_author = Client()
+        self.client_author.force_login(self.author)
+
+    def fill(self, size):
+        """Досоздаёт посты и комментарии до нужного количества."""
+        for i in range(Post.objects.count(), size):
+            commentator = User.objects.create_user(username=f'user_{i}')
+            Post.objects.create(
+                text=f'Пост №{i}',
+                author=self.author,
+                group=self.group,
+            )
+            Comment.objects.create(
+                post=Post.objects.earliest('pub_date'),
+                author=commentator,
+                text=f'Комментарий №{i}',
+            )
+
+    def urls(self):
+        post = Post.objects.earliest('pub_date')
+        return [
+            (self.client, reverse('posts:index')),
+            (self.client, reverse('posts:group_list', args=[self.group.slug])),
+            (self.client, reverse('posts:group_index')),
+            (self.client, reverse('posts:profile', args=[self.author])),
+            (self.client, reverse('posts:post_detail', args=[post.id])),
+            (self.client, reverse('posts:follow_index')),
+            (self.client, reverse('posts:followers', args=[self.author])),
+            (self.client, reverse('posts:following', args=[self.reader])),
+            (self.client, reverse('posts:post_create')),
+            (self.client_author, reverse('posts:post_edit', args=[post.id])),
+            (self.client, reverse('about:author')),
+            (self.client, reverse('about:tech')),
+        ]
+
+    def test_pages_fit_query_budget(self):
+        """Число запросов страниц не растёт вместе с данными."""
+        for size in DATA_SIZES:
+            self.fill(size)
+            for client, url in self.urls():
+                with self.subTest(size=size, url=url):
+                    cache.clear()
+                    self.assertQueryBudget(client, url)
+
+    def test_report_points_to_template(self):
+        """Отчёт о превышении показывает строку шаблона и стек."""
+        self.fill(3)
+        post = Post.objects.earliest('pub_date')
+        url = reverse('posts:post_detail', args=[post.id])
+        with capture_queries() as log:
+            self.client.get(url)
+        with self.settings(QUERY_BUDGETS={'posts:post_detail': 0}):
+            with self.assertRaises(QueryBudgetExceeded) as error:
+                check_budget('posts:post_detail', log)
+        self.assertIn('posts/post_detail.html:', str(error.exception))
+        self.assertIn('posts/views.py', str(error.exception))
@@ -0,0 +1,106 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import reactions
+from posts.models import Post, Reaction, ReactionCounter
+
+User = get_user_model()
+
+
+class ReactionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.fans = [
+            User.objects.create_user(username=f'fan_{i}') for i in range(3)
+        ]
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост №{i}')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.fans[0])
+
+    def react(self, user, post, kind=Reaction.LIKE, shard=0):
+        with mock.patch('posts.reactions.random.randrange',
+                        return_value=shard):
+            return reactions.toggle(user, post.pk, kind)
+
+    def test_toggle_adds_and_removes(self):
+        post = self.posts[0]
+        self.assertTrue(self.react(self.fans[0], post))
+        self.assertFalse(self.react(self.fans[0], post, shard=1))
+        self.assertFalse(Reaction.objects.exists())
+        counts, mine = reactions.summary([post.pk], self.fans[0])
+        self.assertEqual(counts[post.pk, Reaction.LIKE], 0)
+        self.assertEqual(mine, set())
+
+    def test_counts_are_summed_over_shards(self):
+        post = self.posts[0]
+        for shard, fan in enumerate(self.fans):
+            self.react(fan, post, shard=shard)
+        self.react(self.fans[0], post, Reaction.FIRE)
+        self.assertEqual(ReactionCounter.objects.count(), 4)
+        with self.assertNumQueries(1):
+            counts, mine = reactions.summary(
+                [p.pk for p in self.posts], self.fans[1]
+            )
+        self.assertEqual(counts, {
+            (post.pk, Reaction.LIKE): 3, (post.pk, Reaction.FIRE): 1,
+        })
+        self.assertEqual(mine, {(post.pk, Reaction.LIKE)})
+
+    def test_compact_keeps_totals(self):
+        post = self.posts[0]
+        for shard, fan in enumerate(self.fans):
+            self.react(fan, post, shard=shard)
+        self.react(self.fans[0], post, shard=2)
+        call_command('compactreactions', stdout=StringIO())
+        self.assertEqual(
+            list(ReactionCounter.objects.values_list('shard', 'count')),
+            [(0, 2)],
+        )
+
+    def test_feed_page_fetches_reactions_in_one_query(self):
+        self.react(self.fans[0], self.posts[1])
+        url = reverse('posts:index')
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertContains(response, 'mr-2 btn-primary', count=1)
+        self.assertContains(response, 'Нравится 1')
+
+    def test_react_view_redirects_back(self):
+        post = self.posts[2]
+        response = self.client.post(
+            reverse('posts:react', args=[post.pk, Reaction.SAD]),
+            {'next': reverse('posts:index')},
+        )
+        self.assertRedirects(response, reverse('posts:index'))
+        self.assertTrue(Reaction.objects.filter(
+            user=self.fans[0], post=post, kind=Reaction.SAD
+        ).exists())
+
+    def test_react_requires_post_with_csrf_token(self):
+        url = reverse('posts:react', args=[self.posts[0].pk, Reaction.LIKE])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.fans[0])
+        self.assertTemplateUsed(client.post(url), 'core/403csrf.html')
+        self.assertFalse(Reaction.objects.exists())
+
+    def test_unknown_kind_is_404(self):
+        response = self.client.post(
+            reverse('posts:react', args=[self.posts[0].pk, 'angry'])
+        )
+        self.assertEqual(response.status_code, 404)
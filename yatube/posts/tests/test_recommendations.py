@@ -0,0 +1,74 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import recommendations
+from posts.models import Follow, Recommendation
+from posts.recommendations import FollowGraph
+
+User = get_user_model()
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.friend, cls.pal, cls.star, cls.niche = [
+            User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'pal', 'star', 'niche')
+        ]
+        for user, author in (
+            (cls.reader, cls.friend),
+            (cls.reader, cls.pal),
+            (cls.friend, cls.star),
+            (cls.pal, cls.star),
+            (cls.pal, cls.niche),
+            (cls.friend, cls.pal),
+        ):
+            Follow.objects.create(user=user, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_graph_scores_friends_of_friends(self):
+        graph = FollowGraph.load()
+        self.assertEqual(
+            graph.recommend(graph.index[self.reader.pk], 10),
+            [(self.star.pk, 2), (self.niche.pk, 1)],
+        )
+
+    def test_top_k_limit(self):
+        graph = FollowGraph.load()
+        self.assertEqual(
+            graph.recommend(graph.index[self.reader.pk], 1),
+            [(self.star.pk, 2)],
+        )
+
+    def test_rebuild_replaces_table(self):
+        call_command('rebuildrecommendations', stdout=StringIO())
+        Follow.objects.filter(user=self.pal, author=self.niche).delete()
+        call_command('rebuildrecommendations', stdout=StringIO())
+        self.assertEqual(
+            list(Recommendation.objects.filter(user=self.reader)
+                 .values_list('candidate__username', 'score')),
+            [('star', 2)],
+        )
+
+    def test_follow_page_shows_recommendations(self):
+        recommendations.rebuild()
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(
+            response, reverse('posts:profile_follow', args=['star'])
+        )
+
+    def test_followed_candidate_hidden_before_rebuild(self):
+        recommendations.rebuild()
+        Follow.objects.create(user=self.reader, author=self.star)
+        self.assertEqual(
+            recommendations.for_user(self.reader), [self.niche]
+        )
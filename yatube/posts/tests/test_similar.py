@@ -0,0 +1,104 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from core.tasks import Worker
+from posts import similar
+from posts.models import Post, PostNeighbour, TermFrequency
+
+User = get_user_model()
+
+TEXTS = (
+    'Кошки любят рыбу и спят на солнце',
+    'Кошка спала на солнце после рыбы',
+    'Python and Django make web development fast',
+    'Django web framework written in Python',
+    'Погода сегодня дождливая',
+)
+
+
+class SimilarPostsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=text)
+            for text in TEXTS
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tokenize_stems_both_languages(self):
+        self.assertEqual(
+            similar.tokenize('Кошки и кошка; Frameworks, framework!'),
+            ['кошки', 'кошка', 'framew', 'framew'],
+        )
+
+    def test_rebuild_pairs_posts_by_topic(self):
+        call_command('rebuildsimilar', stdout=StringIO())
+        cats, cat, python, django, weather = self.posts
+        self.assertEqual(similar.for_post(cats), [cat])
+        self.assertEqual(similar.for_post(django), [python])
+        self.assertEqual(similar.for_post(weather), [])
+
+    def test_new_post_updates_neighbours_incrementally(self):
+        similar.rebuild()
+        post = Post.objects.create(
+            author=self.author, text='Django and Python tutorial'
+        )
+        Worker('test').run_once()
+        python, django = self.posts[2:4]
+        self.assertEqual(
+            set(similar.for_post(post)), {python, django}
+        )
+        self.assertIn(post, similar.for_post(django))
+
+    def test_update_does_not_reload_corpus(self):
+        similar.rebuild()
+        post = Post.objects.create(
+            author=self.author, text='Кошки спят на солнце'
+        )
+        with mock.patch.object(
+            similar.Corpus, 'load', side_effect=AssertionError
+        ):
+            Worker('test').run_once()
+        self.assertEqual(similar.for_post(post)[0], self.posts[0])
+
+    def test_frequencies_follow_new_edited_and_deleted_posts(self):
+        similar.rebuild()
+        post = Post.objects.create(author=self.author, text='Кошки и погода')
+        Worker('test').run_once()
+        post.text = 'Django и погода'
+        post.save()
+        Worker('test').run_once()
+        Post.objects.get(pk=self.posts[4].pk).delete()
+        corpus = similar.Corpus.load()
+        self.assertEqual(
+            dict(TermFrequency.objects.values_list('term', 'posts')),
+            {**corpus.df, similar.DOCUMENTS: len(corpus.terms)},
+        )
+
+    def test_post_page_reads_neighbours_with_one_query(self):
+        similar.rebuild()
+        post = self.posts[0]
+        with self.assertNumQueries(1):
+            similar.for_post(post)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertEqual(response.context['similar_posts'], [self.posts[1]])
+
+    def test_deleted_post_leaves_neighbour_lists(self):
+        similar.rebuild()
+        post = Post.objects.get(pk=self.posts[1].pk)
+        post.delete()
+        self.assertFalse(
+            PostNeighbour.objects.filter(neighbour_id=self.posts[1].pk)
+            .exists()
+        )
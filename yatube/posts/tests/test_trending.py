@@ -0,0 +1,120 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import trending, views
+from posts.models import ActivityCounter, Comment, Group, Post
+
+User = get_user_model()
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user')
+        cls.quiet = Group.objects.create(title='Тихая', slug='quiet')
+        cls.busy = Group.objects.create(title='Шумная', slug='busy')
+        cls.old_post = Post.objects.create(
+            author=cls.user, group=cls.quiet, text='Старый'
+        )
+        cls.new_post = Post.objects.create(
+            author=cls.user, group=cls.busy, text='Новый'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def comment(self, post, now):
+        trending.record_comment(
+            Comment(post=post, author=self.user, text='Да'), now
+        )
+
+    def test_events_upsert_minute_and_hour_rows(self):
+        now = timezone.now()
+        for _ in range(3):
+            self.comment(self.old_post, now)
+        rows = ActivityCounter.objects.filter(
+            target=ActivityCounter.POST, object_id=self.old_post.pk
+        )
+        self.assertEqual(
+            sorted(rows.values_list('resolution', 'comments')),
+            [('hour', 3), ('minute', 3)],
+        )
+
+    def test_recent_activity_outranks_older(self):
+        now = timezone.now()
+        for _ in range(3):
+            self.comment(self.old_post, now - timedelta(hours=20))
+        self.comment(self.new_post, now)
+        self.comment(self.new_post, now)
+        ranking = trending.rank(now)
+        self.assertEqual(
+            ranking[ActivityCounter.POST],
+            [self.new_post.pk, self.old_post.pk],
+        )
+        self.assertEqual(
+            ranking[ActivityCounter.GROUP], [self.busy.pk, self.quiet.pk]
+        )
+
+    def test_views_record_activity(self):
+        self.client.post(
+            reverse('posts:add_comment', args=[self.old_post.pk]),
+            {'text': 'Комментарий'},
+        )
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост', 'group': self.quiet.pk},
+        )
+        counter = ActivityCounter.objects.get(
+            target=ActivityCounter.GROUP, object_id=self.quiet.pk,
+            resolution=ActivityCounter.HOUR,
+        )
+        self.assertEqual((counter.posts, counter.comments), (1, 1))
+
+    def test_activity_recorded_in_the_same_write(self):
+        with mock.patch(
+            'posts.views.serialized_write',
+            side_effect=lambda func, *args: func(*args),
+        ) as write:
+            self.client.post(
+                reverse('posts:add_comment', args=[self.old_post.pk]),
+                {'text': 'Комментарий'},
+            )
+            self.client.post(
+                reverse('posts:post_create'),
+                {'text': 'Пост', 'group': self.quiet.pk},
+            )
+        self.assertEqual(
+            [call.args[0] for call in write.call_args_list],
+            [views.publish_comment, views.publish_post],
+        )
+        self.assertTrue(ActivityCounter.objects.filter(
+            target=ActivityCounter.POST, object_id=self.old_post.pk
+        ).exists())
+
+    def test_trending_page_and_sidebar(self):
+        self.comment(self.new_post, timezone.now())
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(response.context['posts'], [self.new_post])
+        self.assertEqual(response.context['hot_groups'], [self.busy])
+
+    def test_prune_drops_counters_outside_window(self):
+        now = timezone.now()
+        self.comment(self.old_post, now - timedelta(hours=72))
+        self.comment(self.old_post, now)
+        call_command('ranktrending', stdout=StringIO())
+        self.assertEqual(
+            sorted(ActivityCounter.objects.filter(
+                target=ActivityCounter.POST
+            ).values_list('resolution', flat=True)),
+            ['hour', 'minute'],
+        )
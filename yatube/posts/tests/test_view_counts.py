@@ -0,0 +1,92 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import view_counts
+from posts.models import Post, PostViewCount
+
+User = get_user_model()
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=3600)
+class ViewCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.other = Post.objects.create(author=cls.author, text='Другой')
+
+    def setUp(self):
+        cache.clear()
+        # Просмотры, оставшиеся от других тестов.
+        view_counts._take()
+
+    def tearDown(self):
+        # Буфер не должен пережить тест: иначе его запишет сброс
+        # при выходе.
+        view_counts._take()
+        cache.clear()
+
+    def test_views_are_buffered_until_flush(self):
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                view_counts.record(self.post.pk)
+        self.assertFalse(PostViewCount.objects.exists())
+        self.assertEqual(view_counts.flush(), 3)
+        self.assertEqual(
+            PostViewCount.objects.get(post=self.post).count, 3
+        )
+
+    def test_flush_batches_increments_by_delta(self):
+        PostViewCount.objects.create(post=self.post, count=10)
+        for post in (self.post, self.other):
+            view_counts.record(post.pk)
+        # Посты, новые строки, один UPDATE на оба, итоги для кеша
+        # и две команды точки сохранения.
+        with self.assertNumQueries(6):
+            view_counts.flush()
+        self.assertEqual(
+            dict(PostViewCount.objects.values_list('post_id', 'count')),
+            {self.post.pk: 11, self.other.pk: 1},
+        )
+
+    def test_flush_goes_through_write_queue(self):
+        view_counts.record(self.post.pk)
+        with mock.patch.object(
+            view_counts, 'serialized_write',
+            side_effect=lambda func, *args: func(*args),
+        ) as write:
+            view_counts.flush()
+        write.assert_called_once_with(view_counts._write, {self.post.pk: 1})
+        self.assertEqual(PostViewCount.objects.get(post=self.post).count, 1)
+
+    @override_settings(VIEW_COUNT_MAX_PENDING=2)
+    def test_full_buffer_wakes_flusher(self):
+        flushed = threading.Event()
+        with mock.patch.object(view_counts, 'flush', side_effect=flushed.set):
+            view_counts.record(self.post.pk)
+            view_counts.record(self.post.pk)
+            self.assertTrue(flushed.wait(5))
+
+    def test_count_includes_pending_views(self):
+        view_counts.record(self.post.pk)
+        view_counts.flush()
+        view_counts.record(self.post.pk)
+        self.assertEqual(view_counts.count(self.post.pk), 2)
+
+    def test_cached_post_page_still_counts_views(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertContains(response, '<span> 2 </span>')
+
+    def test_deleted_post_views_are_dropped(self):
+        view_counts.record(self.other.pk)
+        Post.objects.filter(pk=self.other.pk).delete()
+        view_counts.flush()
+        self.assertFalse(PostViewCount.objects.exists())
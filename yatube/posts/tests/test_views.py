@@ -1,9 +1,13 @@
+import re
+
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 from django import forms
 
+from core.page_cache import CACHE_HEADER, MISS
+from core.testing import run_on_commit
 from posts.models import Follow, Group, Post
 from posts.views import POSTS_PER_PAGE
 
@@ -193,6 +197,13 @@ class PostViewTests(TestCase):
         )
         self.assertNotIn(post_group, another_group_context)
 
+    def index_content(self):
+        """Главная без CSRF-токенов: они новые в каждом ответе."""
+        content = self.authorized_client.get(reverse('posts:index')).content
+        return re.sub(
+            rb'name="csrfmiddlewaretoken" value="\w+"', b'', content
+        )
+
     def test_index_cache(self):
         """
         При удалении записи из базы, она остаётся в response.content
@@ -202,18 +213,12 @@ class PostViewTests(TestCase):
             text='Кешированный пост',
             author=self.user
         )
-        content_before = self.authorized_client.get(
-            reverse('posts:index')
-        ).content
+        content_before = self.index_content()
         post.delete()
-        content_after_delete = self.authorized_client.get(
-            reverse('posts:index')
-        ).content
+        content_after_delete = self.index_content()
         self.assertEqual(content_before, content_after_delete)
         cache.clear()
-        content_after_cache_clear = self.authorized_client.get(
-            reverse('posts:index')
-        ).content
+        content_after_cache_clear = self.index_content()
         self.assertNotEqual(content_before, content_after_cache_clear)
 
 
@@ -265,20 +270,119 @@ class FollowingTests(TestCase):
         Новая запись пользователя появляется в ленте тех,
         кто на него подписан и не появляется в ленте тех, кто не подписан.
         """
-        follow_obj = Follow.objects.create(
-            author=self.author,
-            user=self.follower
-        )
-        post = Post.objects.create(
-            author=self.author,
-            text='Лайк подписка репост'
-        )
+        with run_on_commit():
+            follow_obj = Follow.objects.create(
+                author=self.author,
+                user=self.follower
+            )
+            post = Post.objects.create(
+                author=self.author,
+                text='Лайк подписка репост'
+            )
         response_before = self.authorized_client.get(
             reverse('posts:follow_index')
         )
         self.assertIn(post, response_before.context['page_obj'].object_list)
-        follow_obj.delete()
+        with run_on_commit():
+            follow_obj.delete()
         response_after = self.authorized_client.get(
             reverse('posts:follow_index')
         )
         self.assertNotIn(post, response_after.context['page_obj'].object_list)
+
+
+class GroupIndexTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.latest_author = User.objects.create_user(username='latest')
+        cls.group = Group.objects.create(title='Активная', slug='active')
+        cls.empty_group = Group.objects.create(title='Пустая', slug='empty')
+        for i in range(3):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост №{i}'
+            )
+        cls.latest = Post.objects.create(
+            author=cls.latest_author, group=cls.group, text='Последний'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stats_come_from_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('posts:group_index'))
+        groups = list(response.context['groups'])
+        self.assertEqual(groups, [self.group, self.empty_group])
+        self.assertEqual(groups[0].post_count, 4)
+        self.assertEqual(groups[0].last_pub_date, self.latest.pub_date)
+        self.assertEqual(groups[0].last_author, 'latest')
+        self.assertEqual(groups[1].post_count, 0)
+
+    def test_new_post_invalidates_cached_page(self):
+        url = reverse('posts:group_index')
+        self.client.get(url)
+        with run_on_commit():
+            Post.objects.create(
+                author=self.author, group=self.empty_group, text='Первый'
+            )
+        response = self.client.get(url)
+        self.assertEqual(
+            list(response.context['groups'])[0], self.empty_group
+        )
+
+
+class ShellVersionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Первый'
+        )
+        self.other_post = Post.objects.create(
+            author=self.other, text='Чужой'
+        )
+
+    def rendered(self, url):
+        """Страница собрана заново, а не отдана из кеша."""
+        return self.client.get(url)[CACHE_HEADER] == MISS
+
+    def test_edit_invalidates_only_own_pages(self):
+        own = [
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:group_list', args=[self.group.slug]),
+        ]
+        foreign = [
+            reverse('posts:post_detail', args=[self.other_post.pk]),
+            reverse('posts:profile', args=[self.other.username]),
+            reverse('posts:group_index'),
+        ]
+        for url in own + foreign:
+            self.client.get(url)
+        self.post.text = 'Исправленный'
+        with run_on_commit():
+            self.post.save()
+        for url in own:
+            with self.subTest(url=url):
+                self.assertTrue(self.rendered(url))
+        for url in foreign:
+            with self.subTest(url=url):
+                self.assertFalse(self.rendered(url))
+
+    def test_comment_invalidates_its_post(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        other_url = reverse('posts:post_detail', args=[self.other_post.pk])
+        self.client.get(url)
+        self.client.get(other_url)
+        with run_on_commit():
+            self.post.comments.create(author=self.other, text='Комментарий')
+        self.assertTrue(self.rendered(url))
+        self.assertFalse(self.rendered(other_url))
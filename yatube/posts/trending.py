@@ -0,0 +1,128 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.page_cache import get_or_compute
+
+from . import feeds, view_counts
+from .models import ActivityCounter, Group
+
+RANKING_KEY = 'trending:ranking'
+# Новый пост в группе весит как несколько комментариев.
+POST_WEIGHT = 3
+
+
+def _buckets(now):
+    return (
+        (ActivityCounter.MINUTE, now.replace(second=0, microsecond=0)),
+        (ActivityCounter.HOUR, now.replace(minute=0, second=0,
+                                           microsecond=0)),
+    )
+
+
+def _bump(target, object_id, field, now=None):
+    """
+    +1 к счётчикам текущей минуты и часа. Обычно это один UPDATE
+    на интервал; строку создаёт первое событие интервала, а гонку
+    двух первых событий разрешает уникальный ключ.
+    """
+    for resolution, bucket in _buckets(now or timezone.now()):
+        counter = ActivityCounter.objects.filter(
+            target=target, object_id=object_id,
+            resolution=resolution, bucket=bucket,
+        )
+        if counter.update(**{field: F(field) + 1}):
+            continue
+        try:
+            with transaction.atomic():
+                ActivityCounter.objects.create(
+                    target=target, object_id=object_id,
+                    resolution=resolution, bucket=bucket, **{field: 1},
+                )
+        except IntegrityError:
+            counter.update(**{field: F(field) + 1})
+
+
+def record_post(post, now=None):
+    if post.group_id:
+        _bump(ActivityCounter.GROUP, post.group_id, 'posts', now)
+
+
+def record_comment(comment, now=None):
+    _bump(ActivityCounter.POST, comment.post_id, 'comments', now)
+    if comment.post.group_id:
+        _bump(ActivityCounter.GROUP, comment.post.group_id, 'comments', now)
+
+
+def _window(now):
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    return hour, hour - timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+
+
+def rank(now=None):
+    """
+    Рейтинг постов и групп: события с весом, который убывает вдвое
+    за TRENDING_HALF_LIFE_HOURS. Текущий час считается по минутам,
+    прошлые — по часовым счётчикам, так что ничего не учтено дважды.
+    """
+    now = now or timezone.now()
+    hour, since = _window(now)
+    rows = ActivityCounter.objects.filter(
+        Q(resolution=ActivityCounter.MINUTE, bucket__gte=hour)
+        | Q(resolution=ActivityCounter.HOUR, bucket__gte=since,
+            bucket__lt=hour)
+    ).values_list('target', 'object_id', 'bucket', 'posts', 'comments')
+    scores = {
+        ActivityCounter.POST: Counter(),
+        ActivityCounter.GROUP: Counter(),
+    }
+    for target, object_id, bucket, posts, comments in rows:
+        age = (now - bucket).total_seconds() / 3600
+        decay = 0.5 ** (age / settings.TRENDING_HALF_LIFE_HOURS)
+        scores[target][object_id] += (posts * POST_WEIGHT + comments) * decay
+    return {
+        target: [pk for pk, _ in counter.most_common(settings.TRENDING_SIZE)]
+        for target, counter in scores.items()
+    }
+
+
+def ranking():
+    """Рейтинг из кеша; пересчитывает его один запрос, а не все сразу."""
+    return get_or_compute(RANKING_KEY, rank, settings.TRENDING_TIMEOUT)
+
+
+def hot_posts():
+    return feeds.hydrate(ranking()[ActivityCounter.POST])
+
+
+def most_viewed_posts():
+    return feeds.hydrate(
+        view_counts.most_viewed(settings.MOST_VIEWED_SHOWN)
+    )
+
+
+def hot_groups(limit=None):
+    limit = limit or settings.HOT_GROUPS_SHOWN
+    ids = ranking()[ActivityCounter.GROUP][:limit]
+    groups = feeds.cached_objects(Group, ids)
+    return [groups[pk] for pk in ids if pk in groups]
+
+
+def refresh():
+    cache.delete(RANKING_KEY)
+    return ranking()
+
+
+def prune(now=None):
+    """Удаляет счётчики, которые уже не попадают в окно рейтинга."""
+    hour, since = _window(now or timezone.now())
+    deleted, _ = ActivityCounter.objects.filter(
+        Q(resolution=ActivityCounter.MINUTE, bucket__lt=hour)
+        | Q(resolution=ActivityCounter.HOUR, bucket__lt=since)
+    ).delete()
+    return deleted
@@ -5,7 +5,19 @@ from . import views
 app_name = 'posts'
 urlpatterns = [
     path('', views.index, name='index'),
+    path('trending/', views.trending_posts, name='trending'),
+    path('groups/', views.group_index, name='group_index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path(
+        'group/<slug:slug>/follow/',
+        views.group_follow,
+        name='group_follow'
+    ),
+    path(
+        'group/<slug:slug>/unfollow/',
+        views.group_unfollow,
+        name='group_unfollow'
+    ),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
@@ -15,6 +27,11 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    path(
+        'posts/<int:post_id>/react/<str:kind>/',
+        views.react,
+        name='react'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
@@ -26,4 +43,28 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path(
+        'profile/<str:username>/followers/',
+        views.follow_list,
+        {'kind': 'followers'},
+        name='followers'
+    ),
+    path(
+        'profile/<str:username>/following/',
+        views.follow_list,
+        {'kind': 'following'},
+        name='following'
+    ),
+    path(
+        'api/profile/<str:username>/followers/',
+        views.follow_list_api,
+        {'kind': 'followers'},
+        name='api_followers'
+    ),
+    path(
+        'api/profile/<str:username>/following/',
+        views.follow_list_api,
+        {'kind': 'following'},
+        name='api_following'
+    ),
 ]
@@ -0,0 +1,146 @@
+"""
+Счётчик просмотров постов без UPDATE на каждый просмотр: просмотры
+копятся в памяти процесса, и фоновый поток раз в
+VIEW_COUNT_FLUSH_INTERVAL секунд (или при VIEW_COUNT_MAX_PENDING
+просмотрах) пишет их в PostViewCount пачкой инкрементов F() через
+serialized_write. При падении процесса теряется не больше одного
+интервала просмотров.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F
+
+from core.sqlite import serialized_write
+
+from .models import Post, PostViewCount
+
+logger = logging.getLogger('yatube.performance')
+
+_pending = Counter()
+_lock = threading.Lock()
+_wake = threading.Event()
+_flusher = None
+
+
+def _total_key(post_id):
+    return f'post_views:{post_id}'
+
+
+def _flush_periodically():
+    """Поток сброса: раз в интервал или когда буфер заполнился."""
+    while True:
+        _wake.wait(settings.VIEW_COUNT_FLUSH_INTERVAL)
+        _wake.clear()
+        flush()
+        connections.close_all()
+
+
+def _ensure_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(
+                target=_flush_periodically, name='view-count-flusher',
+                daemon=True,
+            )
+            _flusher.start()
+
+
+def record(post_id):
+    """Засчитывает просмотр; запрос в базу не ходит."""
+    with _lock:
+        _pending[post_id] += 1
+        full = sum(_pending.values()) >= settings.VIEW_COUNT_MAX_PENDING
+    _ensure_flusher()
+    if full:
+        _wake.set()
+
+
+def _take():
+    with _lock:
+        views = dict(_pending)
+        _pending.clear()
+    return views
+
+
+def _write(views):
+    ids = set(Post.objects.filter(
+        pk__in=list(views)
+    ).order_by().values_list('pk', flat=True))
+    by_delta = defaultdict(list)
+    for post_id, delta in views.items():
+        if post_id in ids:
+            by_delta[delta].append(post_id)
+    with transaction.atomic():
+        PostViewCount.objects.bulk_create(
+            [PostViewCount(post_id=post_id) for post_id in ids],
+            ignore_conflicts=True,
+        )
+        # Один UPDATE на каждое различное приращение, а не на пост.
+        for delta, post_ids in by_delta.items():
+            PostViewCount.objects.filter(post_id__in=post_ids).update(
+                count=F('count') + delta
+            )
+    totals = PostViewCount.objects.filter(post_id__in=ids)
+    cache.set_many(
+        {_total_key(pk): count for pk, count in totals.values_list(
+            'post_id', 'count'
+        )},
+        settings.OBJECT_CACHE_TIMEOUT,
+    )
+
+
+def flush():
+    """Пишет накопленные просмотры в базу; возвращает их число."""
+    views = _take()
+    if not views:
+        return 0
+    try:
+        serialized_write(_write, views)
+    except Exception:
+        # База недоступна — вернём просмотры в буфер до следующей попытки.
+        logger.warning('Просмотры не записаны', exc_info=True)
+        with _lock:
+            _pending.update(views)
+        return 0
+    return sum(views.values())
+
+
+def count(post_id):
+    """Записанные просмотры (из кеша) плюс ещё не сброшенные."""
+    total = cache.get(_total_key(post_id))
+    if total is None:
+        total = PostViewCount.objects.filter(
+            post_id=post_id
+        ).values_list('count', flat=True).first() or 0
+        cache.set(_total_key(post_id), total, settings.OBJECT_CACHE_TIMEOUT)
+    with _lock:
+        return total + _pending[post_id]
+
+
+def most_viewed(limit):
+    """id самых просматриваемых постов — по индексу на count."""
+    return list(PostViewCount.objects.order_by(
+        '-count'
+    ).values_list('post_id', flat=True)[:limit])
+
+
+def _flush_at_exit():
+    # Повторить запись уже некому: это и есть допустимая потеря.
+    # Поток очереди записей при остановке может не запуститься —
+    # пишем сами: других писателей в процессе уже нет.
+    views = _take()
+    if views:
+        try:
+            _write(views)
+        except Exception:
+            logger.info('Просмотры при остановке не записаны', exc_info=True)
+
+
+atexit.register(_flush_at_exit)
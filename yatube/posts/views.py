@@ -1,84 +1,154 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.db.models.functions import Length
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.utils.http import is_safe_url
+from django.views.decorators.http import require_POST
+
+from core.page_cache import (cache_page_coalesced, shared_page_key,
+                             versioned_page_key)
+from core.queryset_cache import CachedQuerySet
+from core.sqlite import serialized_write
 
+from . import feeds, follows, reactions, shells, similar, trending
 from .forms import PostForm, CommentForm
-from .models import Follow, Group, Post
+from .models import Follow, Group, GroupFollow, Post, Reaction
 
 User = get_user_model()
 
 POSTS_PER_PAGE = 10
 
 
+def shell_cache(scopes=None):
+    """
+    Страницы кешируются одни на всех, данные пользователя в них — дырки,
+    которые заполняет HoleMiddleware. Главная живёт 20 секунд, остальные —
+    до изменения своих данных: областей scopes из posts.shells.
+    """
+    return cache_page_coalesced(
+        settings.SHELL_CACHE_TIMEOUT, key_func=versioned_page_key(scopes)
+    )
+
+
+# Ленты при сбое базы отдают последнюю удачную копию.
+feed_cache = partial(
+    cache_page_coalesced,
+    stale_timeout=settings.FEED_STALE_TIMEOUT,
+    serve_stale_on_error=True,
+)
+
+
+def cached_users():
+    return CachedQuerySet(User).cache()
+
+
 def pagination(request, posts):
     paginator = Paginator(posts, POSTS_PER_PAGE)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 
-@cache_page(20)
+def feed_pagination(request, feed):
+    """Страница ленты: id из кеша списков, посты — из кеша объектов."""
+    page_obj = pagination(request, feeds.post_ids(feed))
+    page_obj.object_list = feeds.hydrate(page_obj.object_list)
+    return page_obj
+
+
+@feed_cache(20, key_func=shared_page_key)
 def index(request):
-    posts = (
-        Post.objects.all().
-        select_related('author', 'group').
-        annotate(post_length=Length('text'))
-    )
-    page_obj = pagination(request, posts)
+    page_obj = feed_pagination(request, feeds.index_feed())
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
-def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = (
-        group.posts.select_related('author').
-        annotate(post_length=Length('text'))
+@shell_cache(lambda: [shells.GROUPS])
+def group_index(request):
+    """Все группы с числом постов и последним постом — одним запросом."""
+    latest = Post.objects.filter(group=OuterRef('pk')).order_by(
+        '-pub_date', '-id'
     )
-    page_obj = pagination(request, posts)
+    groups = Group.objects.annotate(
+        post_count=Count('posts'),
+        last_pub_date=Max('posts__pub_date'),
+        last_author=Subquery(latest.values('author__username')[:1]),
+    ).order_by(F('last_pub_date').desc(nulls_last=True), 'title')
+    return render(request, 'posts/group_index.html', {'groups': groups})
+
+
+@feed_cache(
+    settings.SHELL_CACHE_TIMEOUT,
+    key_func=versioned_page_key(shells.group_scopes),
+)
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.cache(), slug=slug)
+    page_obj = feed_pagination(request, feeds.group_feed(group.pk))
     context = {
         'group': group,
         'page_obj': page_obj,
+        'hot_groups': trending.hot_groups(),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@feed_cache(60, key_func=shared_page_key)
+def trending_posts(request):
+    context = {
+        'posts': trending.hot_posts(),
+        'hot_groups': trending.hot_groups(),
+        'most_viewed': trending.most_viewed_posts(),
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+@shell_cache(shells.profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=author)
-    following = (
-        request.user.is_authenticated
-        and Follow.objects.filter(user=request.user, author=author).exists()
-    )
-    page_obj = pagination(request, posts)
+    author = get_object_or_404(cached_users(), username=username)
+    page_obj = feed_pagination(request, feeds.author_feed(author.pk))
     context = {
         'author': author,
-        'following': following,
         'page_obj': page_obj,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@shell_cache(shells.post_scopes)
 def post_detail(request, post_id):
     post = get_object_or_404(
         Post.objects.
         select_related('author', 'group'),
         id=post_id
     )
-    form = CommentForm()
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     context = {
         'post': post,
-        'form': form,
-        'comments': comments
+        'comments': comments,
+        'similar_posts': similar.for_post(post),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@transaction.atomic
+def publish_post(post):
+    """Пост и счётчик активности группы — одной записью."""
+    post.save()
+    trending.record_post(post)
+
+
+@transaction.atomic
+def publish_comment(comment):
+    comment.save()
+    trending.record_comment(comment)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -90,7 +160,7 @@ def post_create(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
+            serialized_write(publish_post, post)
             return redirect('posts:profile', username=request.user)
         context['errors'] = form.errors
         return render(request, 'posts/create_post.html', context)
@@ -108,7 +178,7 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        serialized_write(form.save)
         return redirect('posts:post_detail', post_id=post_id)
     return render(
         request,
@@ -125,16 +195,27 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        serialized_write(publish_comment, comment)
+    return redirect('posts:post_detail', post_id=post_id)
+
+
+@login_required
+@require_POST
+def react(request, post_id, kind):
+    if kind not in dict(Reaction.KINDS):
+        raise Http404
+    post = get_object_or_404(Post, id=post_id)
+    serialized_write(reactions.toggle, request.user, post.pk, kind)
+    next_url = request.POST.get('next', '')
+    if is_safe_url(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user
-    )
-    page_obj = pagination(request, posts)
+    page_obj = pagination(request, feeds.follow_feed(request.user.pk))
+    page_obj.object_list = feeds.hydrate(page_obj.object_list)
     context = {
         'page_obj': page_obj,
     }
@@ -143,15 +224,17 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(cached_users(), username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        serialized_write(
+            Follow.objects.get_or_create, user=request.user, author=author
+        )
     return redirect('posts:profile', username=author)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(cached_users(), username=username)
     follower = Follow.objects.filter(
         user=request.user,
         author=author
@@ -159,3 +242,60 @@ def profile_unfollow(request, username):
     if follower.exists():
         follower.delete()
     return redirect('posts:profile', username=author)
+
+
+@login_required
+def group_follow(request, slug):
+    group = get_object_or_404(Group.objects.cache(), slug=slug)
+    serialized_write(
+        GroupFollow.objects.get_or_create, user=request.user, group=group
+    )
+    return redirect('posts:group_list', slug=slug)
+
+
+@login_required
+def group_unfollow(request, slug):
+    group = get_object_or_404(Group.objects.cache(), slug=slug)
+    subscription = GroupFollow.objects.filter(user=request.user, group=group)
+    if subscription.exists():
+        subscription.delete()
+    return redirect('posts:group_list', slug=slug)
+
+
+def follow_rows(request, username, kind):
+    """Владелец списка, строки с флагом «читаю» и курсор дальше."""
+    owner = get_object_or_404(cached_users(), username=username)
+    users, next_cursor = follows.follow_page(
+        owner, kind, follows.parse_cursor(request.GET.get('after'))
+    )
+    followed = follows.followed_ids(request.user, users)
+    rows = [{'user': user, 'following': user.pk in followed} for user in users]
+    return owner, rows, next_cursor
+
+
+def follow_list(request, username, kind):
+    owner, rows, next_cursor = follow_rows(request, username, kind)
+    context = {
+        'owner': owner,
+        'kind': kind,
+        'rows': rows,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/follow_list.html', context)
+
+
+def follow_list_api(request, username, kind):
+    _, rows, next_cursor = follow_rows(request, username, kind)
+    results = [
+        {
+            'id': row['user'].pk,
+            'username': row['user'].username,
+            'full_name': row['user'].get_full_name(),
+            'following': row['following'],
+        }
+        for row in rows
+    ]
+    next_url = None
+    if next_cursor is not None:
+        next_url = f'{request.path}?after={next_cursor}'
+    return JsonResponse({'results': results, 'next': next_url})
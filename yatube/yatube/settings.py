@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -63,12 +64,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.replica_pinning.ReplicaPinningMiddleware',
+    'core.middleware.server_timing.ServerTimingMiddleware',
+    'core.middleware.metrics.MetricsMiddleware',
+    'core.middleware.slow_queries.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.holes.HoleMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -100,9 +107,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'OPTIONS': {
+            'timeout': 5,
+        },
     }
 }
 
+# Применяются к каждому новому соединению с SQLite (core.sqlite)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+# Сериализовать записи постов, комментариев и подписок через очередь
+# процесса с групповой фиксацией (core.sqlite.serialized_write)
+SQLITE_WRITE_QUEUE = os.getenv('SQLITE_WRITE_QUEUE', default='') == '1'
+
 if ENABLE_PROD:
     DATABASES = {
         'default': {
@@ -115,6 +139,24 @@ if ENABLE_PROD:
         }
     }
 
+# Реплики только для чтения: через запятую имена баз (пути к копиям
+# SQLite локально). В тестах реплики зеркалят default.
+DATABASE_REPLICAS = []
+for number, name in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), start=1
+):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': name,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+
+# Сколько секунд после записи пользователь читает из default
+REPLICA_PIN_SECONDS = 5
+
 
 
 # Password validation
@@ -159,20 +201,197 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'static_collection/')  # папка статики
 
+# Сессии — в общем кеше с записью в базу, пользователь сессии — тоже
+# из кеша (core.auth); истёкшие сессии чистит manage.py purgesessions
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = ['core.auth.CachedModelBackend']
+AUTH_USER_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_USER_CACHE_TIMEOUT', default='3600')
+)
+SESSION_PURGE_BATCH_SIZE = 1000
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма уходят в очередь задач и отправляются runworker'ом
+# через QUEUED_EMAIL_BACKEND (по умолчанию — в файлы, как раньше)
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+QUEUED_EMAIL_BACKEND = os.getenv(
+    'QUEUED_EMAIL_BACKEND',
+    default='django.core.mail.backends.filebased.EmailBackend'
+)
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Тесты получают свой каталог общего кеша, см. core.testing
+TEST_RUNNER = 'core.testing.TestRunner'
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Двухуровневый кеш: LRU в процессе перед общим для всех воркеров
+# кешем — memcached, если задан MEMCACHED_LOCATION, иначе файловым.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 60,
+            'CHECK_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.AtomicFileBasedCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'yatube_cache')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+if os.getenv('MEMCACHED_LOCATION'):
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.getenv('MEMCACHED_LOCATION'),
     }
+
+# Срок по умолчанию для выборок, помеченных queryset.cache()
+QUERYSET_CACHE_TIMEOUT = int(
+    os.getenv('QUERYSET_CACHE_TIMEOUT', default='300')
+)
+
+# Ленты как списки id постов и кеш отдельных объектов для них
+FEED_IDS_TIMEOUT = int(os.getenv('FEED_IDS_TIMEOUT', default='3600'))
+OBJECT_CACHE_TIMEOUT = int(
+    os.getenv('OBJECT_CACHE_TIMEOUT', default='3600')
+)
+# Сколько первых id общей ленты, лент групп и авторов держать
+# в кеше (10 страниц); дальние страницы читаются из базы
+FEED_SIZE = 100
+# Сколько первых постов ленты подписок держать в кеше (3 страницы)
+FOLLOW_FEED_SIZE = 30
+# Сколько подписчиков источника помнить в обратном индексе в кеше;
+# у популярных авторов и групп подписчиков ищем в базе
+FEED_FOLLOWERS_LIMIT = 1000
+
+# Рекомендации «кого почитать» (manage.py rebuildrecommendations):
+# сколько хранить на пользователя и сколько показывать
+RECOMMENDATIONS_PER_USER = 20
+RECOMMENDATIONS_SHOWN = 5
+
+# Похожие посты по TF-IDF (manage.py rebuildsimilar, новые посты —
+# задачей в очереди): сколько хранить на пост и сколько показывать
+SIMILAR_POSTS_PER_POST = 10
+SIMILAR_POSTS_SHOWN = 5
+
+# Популярное: окно и период полураспада рейтинга, размер и срок его
+# копии в кеше (manage.py ranktrending пересчитывает и чистит счётчики)
+TRENDING_WINDOW_HOURS = 48
+TRENDING_HALF_LIFE_HOURS = 6
+TRENDING_SIZE = 20
+TRENDING_TIMEOUT = 60
+HOT_GROUPS_SHOWN = 5
+
+# Просмотры постов копятся в памяти процесса и пишутся в базу раз
+# в VIEW_COUNT_FLUSH_INTERVAL секунд или при VIEW_COUNT_MAX_PENDING
+# просмотрах — столько и теряется при падении процесса
+VIEW_COUNT_FLUSH_INTERVAL = float(
+    os.getenv('VIEW_COUNT_FLUSH_INTERVAL', default='10')
+)
+VIEW_COUNT_MAX_PENDING = 1000
+MOST_VIEWED_SHOWN = 5
+
+# На сколько строк делится счётчик реакций поста
+# (manage.py compactreactions сливает их обратно)
+REACTION_SHARDS = 8
+
+# Сколько живёт общая для всех пользователей копия страницы
+SHELL_CACHE_TIMEOUT = int(os.getenv('SHELL_CACHE_TIMEOUT', default='300'))
+
+# Лента отдаёт устаревшую копию (до FEED_STALE_TIMEOUT секунд),
+# если база упала
+FEED_STALE_TIMEOUT = int(os.getenv('FEED_STALE_TIMEOUT', default='3600'))
+
+# Очередь фоновых задач в базе (manage.py runworker)
+TASK_BATCH_SIZE = 10
+TASK_POLL_INTERVAL = 1
+TASK_LOCK_TIMEOUT = 300
+TASK_RETRY_DELAY = 5
+TASK_MAX_ATTEMPTS = 5
+
+# Лимиты SQL-запросов на страницу, проверяются в тестах
+QUERY_BUDGETS = {
+    'posts:index': 5,
+    'posts:group_list': 8,
+    'posts:group_index': 3,
+    'posts:profile': 8,
+    'posts:post_detail': 9,
+    'posts:post_create': 3,
+    'posts:post_edit': 5,
+    'posts:follow_index': 8,
+    'posts:trending': 4,
+    'posts:followers': 5,
+    'posts:following': 5,
+    'about:author': 2,
+    'about:tech': 2,
+}
+
+# Доля запросов, которым отдаётся заголовок Server-Timing
+# (сотрудникам — всегда)
+SERVER_TIMING_SAMPLE_RATE = float(
+    os.getenv('SERVER_TIMING_SAMPLE_RATE', default='0.01')
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'yatube.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', default='WARNING'),
+        },
+        'yatube.tasks': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
 }
+
+# Адреса, с которых доступен /metrics
+INTERNAL_IPS = os.getenv('INTERNAL_IPS', default='127.0.0.1').split(',')
+
+# Общий каталог для снимков метрик воркеров (пусто — без агрегации)
+METRICS_DIR = os.getenv('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = 5
+
+# Журнал медленных SQL-запросов (manage.py slowqueries)
+SLOW_QUERY_THRESHOLD_MS = float(
+    os.getenv('SLOW_QUERY_THRESHOLD_MS', default='100')
+)
+SLOW_QUERY_LOG = os.getenv(
+    'SLOW_QUERY_LOG', default=os.path.join(BASE_DIR, 'slow_queries.log')
+)
+SLOW_QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 3
+
+# Профилирование живых запросов сотрудников: заголовок X-Profile или
+# доля их запросов; результаты — pstats и collapsed stacks
+PROFILING_DIR = os.getenv(
+    'PROFILING_DIR', default=os.path.join(BASE_DIR, 'profiles')
+)
+PROFILING_MODE = 'sample'
+PROFILING_SAMPLE_RATE = float(
+    os.getenv('PROFILING_SAMPLE_RATE', default='0')
+)
+PROFILING_SAMPLE_INTERVAL = 0.005